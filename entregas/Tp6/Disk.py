@@ -19,7 +19,10 @@ class Program():
     def expand(self, instructions):
         expanded = []
         for i in instructions:
-            if isinstance(i, list):
+            if isinstance(i, tuple):
+                ## is a run (opcode, times)
+                expanded.extend([i[0]] * i[1])
+            elif isinstance(i, list):
                 ## is a list of instructions
                 expanded.extend(i)
             else:
@@ -1,30 +1,57 @@
 #!/usr/bin/env python
 
 from tabulate import tabulate
-from time import sleep
-from threading import Thread, Lock
+from time import sleep, perf_counter
+from threading import Thread, Lock, RLock, local
+from heapq import heappush, heappop
+import mmap
+from collections import OrderedDict
 import log
 
 ##  Estas son la instrucciones soportadas por nuestro CPU
-INSTRUCTION_IO = 'IO'
-INSTRUCTION_CPU = 'CPU'
-INSTRUCTION_EXIT = 'EXIT'
+##  cada instruccion es un opcode de un byte
+INSTRUCTION_EMPTY = 0   ## celda de memoria vacia
+INSTRUCTION_CPU = 1
+INSTRUCTION_IO = 2
+INSTRUCTION_EXIT = 3
+## IO al device numero n del registro de HARDWARE: el 0 usa INSTRUCTION_IO, el resto INSTRUCTION_EXIT + n
+INSTRUCTION_MAX = 255
+
+INSTRUCTION_NAMES = ['', 'CPU', 'IO', 'EXIT']
 
 
 ## Helper for emulated machine code
 class ASM():
 
+    ## EXIT y CPU retornan una rafaga (opcode, veces) que Program guarda sin expandir
     @classmethod
     def EXIT(self, times):
-        return [INSTRUCTION_EXIT] * times
+        return (INSTRUCTION_EXIT, times)
 
+    ## device: numero (o deviceId) del device en el registro de HARDWARE, por defecto el 0 (Printer)
+    @classmethod
+    def IO(self, device = 0):
+        if isinstance(device, str):
+            device = HARDWARE.deviceNumber(device)
+        ## el device 0 (el de por defecto) siempre existe, se puede usar antes del setup del hardware
+        if device == 0:
+            return INSTRUCTION_IO
+        if device < 0 or device >= len(HARDWARE.ioDevices):
+            raise Exception("Device number {device} is not registered ({cant} devices)".format(device = device, cant = len(HARDWARE.ioDevices)))
+        if INSTRUCTION_EXIT + device > INSTRUCTION_MAX:
+            raise Exception("Device number {device} can't be encoded in an IO instruction".format(device = device))
+        return INSTRUCTION_EXIT + device
+
+    ## numero del device de una instruccion IO
     @classmethod
-    def IO(self):
-        return INSTRUCTION_IO
+    def deviceOf(self, instruction):
+        if instruction == INSTRUCTION_IO:
+            return 0
+        return instruction - INSTRUCTION_EXIT
 
     @classmethod
     def CPU(self, times):
-        return [INSTRUCTION_CPU] * times
+        return (INSTRUCTION_CPU, times)
 
     @classmethod
     def isEXIT(self, instruction):
@@ -32,7 +59,17 @@ class ASM():
 
     @classmethod
     def isIO(self, instruction):
-        return INSTRUCTION_IO == instruction
+        return INSTRUCTION_IO == instruction or instruction > INSTRUCTION_EXIT
+
+    @classmethod
+    def isCPU(self, instruction):
+        return INSTRUCTION_CPU == instruction
+
+    @classmethod
+    def name(self, instruction):
+        if instruction > INSTRUCTION_EXIT:
+            return "IO:{device}".format(device = ASM.deviceOf(instruction))
+        return INSTRUCTION_NAMES[instruction]
 
 
 
@@ -44,6 +81,13 @@ NEW_INTERRUPTION_TYPE = "#NEW"
 TIMEOUT_INTERRUPTION_TYPE = "#TIMEOUT"
 PAGEFAULT = "#PAGEFAULT"
 
+## prioridad de cada interrupcion pendiente (menor = se atiende antes)
+IRQ_PRIORITIES = {PAGEFAULT: 0, KILL_INTERRUPTION_TYPE: 1, IO_IN_INTERRUPTION_TYPE: 1,
+                  TIMEOUT_INTERRUPTION_TYPE: 2, IO_OUT_INTERRUPTION_TYPE: 3, NEW_INTERRUPTION_TYPE: 4}
+IRQ_LOWEST_PRIORITY = 5
+## las que levanta el cpu al ejecutar una instruccion no se pueden enmascarar
+IRQ_NON_MASKABLE = (PAGEFAULT, KILL_INTERRUPTION_TYPE, IO_IN_INTERRUPTION_TYPE)
+
 ## emulates an Interrupt request
 class IRQ:
 
@@ -59,32 +103,114 @@ class IRQ:
     def type(self):
         return self._type
 
-## emulates the Interrupt Vector Table
+## emulates the Interrupt Vector Table and the interrupt controller
+## handle atiende una interrupcion en el momento (traps como PAGEFAULT o NEW)
+## raiseIRQ la deja pendiente: el clock las entrega por prioridad despues del tick de cada subscriber
+## Las interrupciones de un tipo enmascarado quedan pendientes hasta que se desenmascara
 class InterruptVector():
 
     def __init__(self):
         self._handlers = dict()
-        self.lock = Lock()
+        ## un handler puede atender una interrupcion sincronica (ej. un PAGEFAULT) sin trabarse
+        self.lock = RLock()
+        ## pendientes: heap de (prioridad, orden, irq, nucleo que la levanto)
+        self._pending = []
+        self._pendingLock = Lock()
+        self._raised = 0
+        self._masked = set()
 
     def register(self, interruptionType, interruptionHandler):
         self._handlers[interruptionType] = interruptionHandler
 
     def handle(self, irq):
-        log.logger.info("Handling {type} irq with parameters = {parameters}".format(type=irq.type, parameters=irq.parameters ))
+        if log.infoEnabled():
+            log.logger.info("Handling %s irq with parameters = %s", irq.type, irq.parameters)
         self.lock.acquire()
-        self._handlers[irq.type].execute(irq)
-        self.lock.release()
+        try:
+            self._handlers[irq.type].execute(irq)
+        finally:
+            self.lock.release()
+
+    def raiseIRQ(self, irq):
+        priority = IRQ_PRIORITIES.get(irq.type, IRQ_LOWEST_PRIORITY)
+        with self._pendingLock:
+            heappush(self._pending, (priority, self._raised, irq, HARDWARE.core.coreId))
+            self._raised += 1
+
+    def mask(self, interruptionType):
+        if interruptionType in IRQ_NON_MASKABLE:
+            raise Exception("Interruption {type} can't be masked".format(type = interruptionType))
+        self._masked.add(interruptionType)
+
+    def unmask(self, interruptionType):
+        self._masked.discard(interruptionType)
+
+    def isMasked(self, interruptionType):
+        return interruptionType in self._masked
+
+    def pendingCount(self):
+        return len(self._pending)
+
+    ## atiende las pendientes no enmascaradas (tambien las que se levanten mientras tanto)
+    ## cada una con el nucleo que la levanto como nucleo actual
+    def deliverPending(self):
+        while len(self._pending) > 0:
+            with self._pendingLock:
+                pending = self.__popUnmasked()
+            if pending == None:
+                return
+            priority, order, irq, coreId = pending
+            HARDWARE.selectCore(coreId)
+            self.handle(irq)
+
+    def __popUnmasked(self):
+        masked = []
+        pending = None
+        while len(self._pending) > 0 and pending == None:
+            candidate = heappop(self._pending)
+            if candidate[2].type in self._masked:
+                masked.append(candidate)
+            else:
+                pending = candidate
+        for candidate in masked:
+            heappush(self._pending, candidate)
+        return pending
 
 ## emulates the Internal Clock
 class Clock():
 
-    def __init__(self):
+    ## segundos de espera del thread del clock en fastForward cuando no hay eventos (con tickPeriod 0)
+    IDLE_WAIT = 0.01
+
+    ## interruptVector: se le entregan las interrupciones pendientes despues del tick de cada subscriber
+    def __init__(self, fastForward = False, tickPeriod = 1, interruptVector = None):
         self._subscribers = []
+        self._interruptVector = interruptVector
         self._running = False
+        ## en modo fastForward el reloj salta directo al proximo tick con eventos
+        self._fastForward = fastForward
+        ## segundos de espera entre ticks (0 = sin espera)
+        self._tickPeriod = tickPeriod
 
     def addSubscriber(self, subscriber):
         self._subscribers.append(subscriber)
 
+    @property
+    def fastForward(self):
+        return self._fastForward
+
+    @fastForward.setter
+    def fastForward(self, fastForward):
+        self._fastForward = fastForward
+
+    @property
+    def tickPeriod(self):
+        return self._tickPeriod
+
+    @tickPeriod.setter
+    def tickPeriod(self, tickPeriod):
+        self._tickPeriod = tickPeriod
+
     def stop(self):
         self._running = False
 
@@ -97,31 +223,107 @@ class Clock():
     def __start(self):
         tickNbr = 0
         while (self._running):
-            self.tick(tickNbr)
-            tickNbr += 1
+            ## en fastForward sin eventos pendientes no se gira en vacio: se espera hasta que llegue trabajo
+            if self._fastForward and self.__isIdle():
+                sleep(self._tickPeriod if self._tickPeriod > 0 else self.IDLE_WAIT)
+            tickNbr += self.advance(tickNbr)
+
+    ## se consulta con el lock del vector tomado para no ver un cambio de contexto a medias
+    def __isIdle(self):
+        if self._interruptVector == None:
+            return self.quietTicks() == None
+        with self._interruptVector.lock:
+            return self.quietTicks() == None
 
     def tick(self, tickNbr):
-        log.logger.info("        --------------- tick: {tickNbr} ---------------".format(tickNbr = tickNbr))
+        if log.infoEnabled():
+            log.logger.info("        --------------- tick: %s ---------------", tickNbr)
         ## notify all subscriber that a new clock cycle has started
         for subscriber in self._subscribers:
             subscriber.tick(tickNbr)
-        ## wait 1 second and keep looping
-        sleep(1)
+            if self._interruptVector != None:
+                self._interruptVector.deliverPending()
+
+    ## ejecuta el tick tickNbr y retorna la cantidad de ticks consumidos
+    ## en modo fastForward se saltean los ticks en los que no pasa nada
+    def advance(self, tickNbr, maxTicks = None):
+        ## el tick (o el salto) se ejecuta con el lock del vector tomado: el kernel
+        ## no cambia de contexto en el medio (ej. un NEW desde otro thread)
+        if self._interruptVector == None:
+            ticks = self.__advance(tickNbr, maxTicks)
+        else:
+            with self._interruptVector.lock:
+                ticks = self.__advance(tickNbr, maxTicks)
+        ## wait tickPeriod seconds and keep looping
+        if not self._fastForward and self._tickPeriod > 0:
+            sleep(self._tickPeriod)
+        return ticks
+
+    def __advance(self, tickNbr, maxTicks):
+        if not self._fastForward:
+            self.tick(tickNbr)
+            return 1
+        quiet = self.quietTicks()
+        if quiet == None:
+            ## nadie tiene eventos pendientes
+            quiet = 0 if maxTicks == None else maxTicks - 1
+        elif maxTicks != None:
+            quiet = min(quiet, maxTicks - 1)
+        if quiet > 0:
+            if log.infoEnabled():
+                log.logger.info("        --------------- fast forward: %s ticks ---------------", quiet)
+            for subscriber in self._subscribers:
+                subscriber.skip(quiet)
+        self.tick(tickNbr + quiet)
+        return quiet + 1
+
+    ## cantidad de ticks sin eventos antes del proximo evento (None si no hay eventos)
+    def quietTicks(self):
+        nextEvent = None
+        for subscriber in self._subscribers:
+            ticks = subscriber.ticksToNextEvent()
+            if ticks != None and (nextEvent == None or ticks < nextEvent):
+                nextEvent = ticks
+        if nextEvent == None:
+            return None
+        return nextEvent - 1
 
     def do_ticks(self, times):
-        log.logger.info("---- :::: CLOCK do_ticks: {times} ::: -----".format(times=times))
-        for tickNbr in range(0, times):
-            self.tick(tickNbr)
+        log.logger.info("---- :::: CLOCK do_ticks: %s ::: -----", times)
+        tickNbr = 0
+        while tickNbr < times:
+            tickNbr += self.advance(tickNbr, times - tickNbr)
+
+    ## corre el reloj hasta que isIdle() sea verdadero
+    ## retorna la cantidad de ticks ejecutados y el tiempo real que tomo
+    def run_until_idle(self, isIdle):
+        log.logger.info("---- :::: CLOCK run_until_idle ::: -----")
+        start = perf_counter()
+        tickNbr = 0
+        while not isIdle():
+            tickNbr += self.advance(tickNbr)
+        wallTime = perf_counter() - start
+        log.logger.info("---- :::: CLOCK idle after %s ticks (%.3fs) ::: -----", tickNbr, wallTime)
+        return tickNbr, wallTime
 
 ## emulates the main memory (RAM)
 class Memory():
 
+    ## cada celda guarda el opcode de una instruccion en un byte
     def __init__(self, size):
-        self._cells = [''] * size
+        self._cells = bytearray(size)
         self._size = size
+        ## frames modificados desde el ultimo dumpChanged (el MMU configura el tamanio del frame)
+        self._frameSize = 1
+        self._changed = set()
+
+    def setFrameSize(self, frameSize):
+        self._frameSize = frameSize
+        self._changed = set()
 
     def put(self, addr, value):
         self._cells[addr] = value
+        self._changed.add(addr // self._frameSize)
 
     def getSize(self):
         return self._size
@@ -129,18 +331,103 @@ class Memory():
     def get(self, addr):
         return self._cells[addr]
 
+    ## copia una pagina entera de una vez
+    ## instructions puede ser una lista de opcodes o un buffer (ej. una pagina del FileSwapping)
+    def putPage(self, addr, instructions):
+        if addr + len(instructions) > self._size:
+            raise Exception("Invalid Address, page at {addr} exceeds memory size: {size}".format(addr = addr, size = self._size))
+        self._cells[addr:addr + len(instructions)] = instructions
+        if len(instructions) > 0:
+            self._changed.update(range(addr // self._frameSize, (addr + len(instructions) - 1) // self._frameSize + 1))
+
+    ## tabla de las celdas [start, start + cant) (recortada al tamanio de la memoria)
+    def dump(self, start, cant):
+        end = min(start + cant, self._size)
+        return tabulate([(addr, ASM.name(self._cells[addr])) for addr in range(max(0, start), end)], tablefmt='psql')
+
+    ## tabla de los frames modificados desde el ultimo dumpChanged, hasta limit celdas
+    def dumpChanged(self, limit = 256):
+        frames = sorted(self._changed)
+        self._changed = set()
+        if len(frames) == 0:
+            return "(no changes)"
+        shown = frames[:max(1, limit // self._frameSize)]
+        rows = []
+        for frame in shown:
+            for addr in range(frame * self._frameSize, min((frame + 1) * self._frameSize, self._size)):
+                rows.append((addr, ASM.name(self._cells[addr])))
+        table = tabulate(rows, tablefmt='psql')
+        if len(frames) > len(shown):
+            table += "\n... {more} frames more".format(more = len(frames) - len(shown))
+        return table
+
+    ## tabla completa: con mucha memoria es cara, usar dump o dumpChanged
     def __repr__(self):
-        return tabulate(enumerate(self._cells), tablefmt='psql')
+        return tabulate(enumerate(ASM.name(cell) for cell in self._cells), tablefmt='psql')
         ## return "Memoria = {mem}".format(mem=self._cells)
 
 ## emulates the Memory Management Unit (MMU)
+## bits de referencia y de modificado por frame, cantidad de accesos (tiempo virtual) y observers
+## de accesos: los comparten los MMU de todos los nucleos, como los bits de una tabla de paginas
+class FrameBits():
+
+    def __init__(self):
+        self._referenced = bytearray(0)
+        self._dirty = bytearray(0)
+        self._accessCount = 0
+        self._accessObservers = []
+
+    def resize(self, frames):
+        self._referenced = bytearray(frames)
+        self._dirty = bytearray(frames)
+
+    def addAccessObserver(self, accessObserver):
+        self._accessObservers.append(accessObserver)
+
+    def accessCount(self):
+        return self._accessCount
+
+    def isReferenced(self, frameId):
+        return self._referenced[frameId] == 1
+
+    def clearReferenced(self, frameId):
+        self._referenced[frameId] = 0
+
+    def isDirty(self, frameId):
+        return self._dirty[frameId] == 1
+
+    def setDirty(self, frameId):
+        self._dirty[frameId] = 1
+
+    def clearDirty(self, frameId):
+        self._dirty[frameId] = 0
+
+    def access(self, frameId, times):
+        self._referenced[frameId] = 1
+        self._accessCount += times
+        for observer in self._accessObservers:
+            observer.accessed(frameId)
+
 class MMU():
 
-    def __init__(self, memory):
+    ## frameBits: bits de los frames compartidos con los MMU de los otros nucleos
+    def __init__(self, memory, tlbSize = 16, frameBits = None):
         self._memory = memory
         self._frameSize = 0
         self._limit = 999
-        self._tlb = dict()
+        ## TLB con tags: (asid, pagina) -> frame, ordenada del menos al mas recientemente usado
+        self._tlb = OrderedDict()
+        self._tlbSize = tlbSize
+        self._tlbHits = 0
+        self._tlbMisses = 0
+        ## asid (pid) del proceso que corre y su tabla de paginas ({page -> Row}) que se recorre en un miss
+        self._asid = None
+        self._pageTable = None
+        ## bits de referencia y de modificado por frame, se prenden en cada acceso/escritura
+        ## tambien cuentan los accesos y avisan a los observers (ej. la politica de reemplazo)
+        self._frameBits = frameBits
+        if frameBits == None:
+            self._frameBits = FrameBits()
 
     @property
     def limit(self):
@@ -157,18 +444,113 @@ class MMU():
     @frameSize.setter
     def frameSize(self, frameSize):
         self._frameSize = frameSize
+        self._frameBits.resize(self._memory.getSize() // frameSize)
+        self._memory.setFrameSize(frameSize)
+
+    @property
+    def asid(self):
+        return self._asid
+
+    @asid.setter
+    def asid(self, asid):
+        self._asid = asid
+
+    @property
+    def pageTable(self):
+        return self._pageTable
+
+    @pageTable.setter
+    def pageTable(self, pageTable):
+        self._pageTable = pageTable
+
+    def tlbHits(self):
+        return self._tlbHits
+
+    def tlbMisses(self):
+        return self._tlbMisses
+
+    def addAccessObserver(self, accessObserver):
+        self._frameBits.addAccessObserver(accessObserver)
+
+    def accessCount(self):
+        return self._frameBits.accessCount()
+
+    def isReferenced(self, frameId):
+        return self._frameBits.isReferenced(frameId)
+
+    def clearReferenced(self, frameId):
+        self._frameBits.clearReferenced(frameId)
+
+    def isDirty(self, frameId):
+        return self._frameBits.isDirty(frameId)
+
+    def clearDirty(self, frameId):
+        self._frameBits.clearDirty(frameId)
+
+    ## registra times accesos a la pagina de logicalAddress (la pagina tiene que estar cargada)
+    def reference(self, logicalAddress, times = 1):
+        frameId = self._lookup(logicalAddress // self._frameSize)
+        self._tlbHits += times - 1
+        self._frameBits.access(frameId, times)
 
     def resetTLB(self):
-        self._tlb = dict()
+        self._tlb = OrderedDict()
 
+    ## carga en la TLB la pagina del proceso actual, si esta llena sale la menos usada
     def setPageFrame(self, pageId, frameId):
-        self._tlb[pageId] = frameId
+        key = (self._asid, pageId)
+        if frameId == None:
+            self._tlb.pop(key, None)
+            return
+        self._tlb[key] = frameId
+        self._tlb.move_to_end(key)
+        if len(self._tlb) > self._tlbSize:
+            self._tlb.popitem(last=False)
+
+    ## la pagina dejo de estar en su frame
+    def invalidate(self, asid, pageId):
+        self._tlb.pop((asid, pageId), None)
+
+    ## saca de la TLB todas las paginas de un proceso
+    def flushASID(self, asid):
+        for key in [key for key in self._tlb if key[0] == asid]:
+            del self._tlb[key]
 
     def tlb(self):
         return self._tlb
 
+    ## busca el frame de la pagina del proceso actual, en un miss recorre la tabla de paginas
+    ## retorna None si la pagina no esta en memoria
+    def _lookup(self, pageId):
+        key = (self._asid, pageId)
+        frameId = self._tlb.get(key)
+        if frameId != None:
+            self._tlbHits += 1
+            self._tlb.move_to_end(key)
+            return frameId
+        self._tlbMisses += 1
+        frameId = self._walk(pageId)
+        if frameId != None:
+            self.setPageFrame(pageId, frameId)
+        return frameId
+
+    def _walk(self, pageId):
+        row = self._pageTable.get(pageId)
+        if row == None:
+            raise Exception("\n*\n* ERROR \n*\n Error en el MMU\nNo se cargo la pagina  {pageId}".format(pageId = str(pageId)))
+        return row.frame()
+
 
     def fetch(self,  logicalAddress):
+        # obtenemos la instrucción alocada en esa direccion
+        return self._memory.get(self._translate(logicalAddress))
+
+    def store(self, logicalAddress, value):
+        physicalAddress = self._translate(logicalAddress)
+        self._frameBits.setDirty(physicalAddress // self._frameSize)
+        self._memory.put(physicalAddress, value)
+
+    def _translate(self, logicalAddress):
         if (logicalAddress > self._limit):
             raise Exception("Invalid Address,  {logicalAddress} is higher than process limit: {limit}".format(limit = self._limit, logicalAddress = logicalAddress))
 
@@ -177,23 +559,37 @@ class MMU():
         offset = logicalAddress % self._frameSize
 
         # buscamos la direccion Base del frame donde esta almacenada la pagina
-        try:
-            frameId = self._tlb[pageId]
-        except:
-            raise Exception("\n*\n* ERROR \n*\n Error en el MMU\nNo se cargo la pagina  {pageId}".format(pageId = str(pageId)))
+        frameId = self._lookup(pageId)
 
         ##calculamos la direccion fisica resultante
         if frameId == None:
             pageIRQ = IRQ(PAGEFAULT)
             HARDWARE.interruptVector.handle(pageIRQ)
-            frameId = self._tlb[pageId]
-
+            frameId = self._lookup(pageId)
 
+        self._frameBits.access(frameId, 1)
         frameBaseDir  = self._frameSize * frameId
-        physicalAddress = frameBaseDir + offset
+        return frameBaseDir + offset
 
-        # obtenemos la instrucción alocada en esa direccion
-        return self._memory.get(physicalAddress)
+    ## cantidad de instrucciones CPU consecutivas desde logicalAddress sin cambiar de pagina
+    ## (0 si la pagina no esta cargada, porque el fetch daria PAGEFAULT)
+    def cpuRunLength(self, logicalAddress):
+        pageId = logicalAddress // self._frameSize
+        offset = logicalAddress % self._frameSize
+        ## solo se consulta, sin contar hits/misses ni cargar la TLB
+        frameId = self._tlb.get((self._asid, pageId))
+        if frameId == None:
+            frameId = self._walk(pageId)
+        if frameId == None:
+            return 0
+        frameBaseDir = self._frameSize * frameId
+        count = 0
+        while offset < self._frameSize and logicalAddress <= self._limit \
+                and ASM.isCPU(self._memory.get(frameBaseDir + offset)):
+            count += 1
+            offset += 1
+            logicalAddress += 1
+        return count
 
 
 class PageSwapping():
@@ -219,35 +615,139 @@ class PageSwapping():
 class Swapping():
 
     def __init__(self):
-        self._queuePages = []
+        ## pid -> {page -> PageSwapping}
+        self._pagesOfPid = dict()
+        self._occupancy = 0
 
     def queuePages(self):
-        return self._queuePages
+        res = []
+        for pages in self._pagesOfPid.values():
+            res.extend(pages.values())
+        return res
+
+    ## cantidad de paginas guardadas en el swapping
+    def occupancy(self):
+        return self._occupancy
 
     def swapIn(self, pid, page, ins):
-        self.queuePages().append(PageSwapping(pid, page, ins))
+        pages = self._pagesOfPid.get(pid)
+        if pages == None:
+            pages = dict()
+            self._pagesOfPid[pid] = pages
+        if page not in pages:
+            self._occupancy += 1
+        pages[page] = PageSwapping(pid, page, ins)
+
+    def pagesOfPid(self, pid):
+        pages = self._pagesOfPid.get(pid)
+        if pages == None:
+            return []
+        return list(pages.values())
+
+    ## retorna las instrucciones de la pagina y libera su lugar en el swapping
+    def swapOut(self, pid, page):
+        pages = self._pagesOfPid.get(pid)
+        if pages == None or page not in pages:
+            return None
+        pag = pages.pop(page)
+        self._occupancy -= 1
+        if len(pages) == 0:
+            del self._pagesOfPid[pid]
+        return pag.instructions()
+
+    def clear(self, pid):
+        pages = self._pagesOfPid.pop(pid, None)
+        if pages != None:
+            self._occupancy -= len(pages)
+
+    def __repr__(self):
+        return "(" + "SWAPPING ={queue}".format(queue=self.queuePages()) + " OCCUPANCY={occupancy}".format(occupancy=self._occupancy) + ")"
+
+## Swapping guardado en un archivo mapeado en memoria (mmap)
+## el archivo tiene slots de pageSize bytes, con un opcode por byte
+class FileSwapping():
+
+    def __init__(self, path, pageSize, slots):
+        if pageSize <= 0 or slots <= 0:
+            raise Exception("Invalid swap file: pageSize ({pageSize}) and slots ({slots}) must be positive".format(pageSize = pageSize, slots = slots))
+        self._pageSize = pageSize
+        self._slots = slots
+        self._file = open(path, 'w+b')
+        self._file.truncate(pageSize * slots)
+        self._map = mmap.mmap(self._file.fileno(), pageSize * slots)
+        ## slots libres (se usa como pila)
+        self._freeSlots = list(range(slots - 1, -1, -1))
+        ## pid -> {page -> (slot, cantidad de instrucciones)}
+        self._slotsOfPid = dict()
+
+    def queuePages(self):
+        res = []
+        for pid, pages in self._slotsOfPid.items():
+            for page in pages:
+                res.append(PageSwapping(pid, page, list(self.readSlot(pid, page))))
+        return res
+
+    ## cantidad de paginas guardadas en el swapping
+    def occupancy(self):
+        return self._slots - len(self._freeSlots)
+
+    def capacity(self):
+        return self._slots
+
+    def swapIn(self, pid, page, ins):
+        ## una pagina que no entra en el slot pisaria el slot siguiente
+        if len(ins) > self._pageSize:
+            raise Exception("Page {page} of pid {pid} has {cant} instructions, swap slots hold {pageSize}".format(page = page, pid = pid, cant = len(ins), pageSize = self._pageSize))
+        pages = self._slotsOfPid.get(pid)
+        if pages == None:
+            pages = dict()
+            self._slotsOfPid[pid] = pages
+        if page in pages:
+            slot = pages[page][0]
+        elif len(self._freeSlots) > 0:
+            slot = self._freeSlots.pop()
+        else:
+            raise Exception("Swap full, can't swap page {page} of pid {pid}".format(page = page, pid = pid))
+        start = slot * self._pageSize
+        self._map[start:start + len(ins)] = bytes(ins)
+        pages[page] = (slot, len(ins))
 
     def pagesOfPid(self, pid):
         res = []
-        pages = self._queuePages
-        for extruct in pages:
-            if extruct.pid() == pid:
-                res.append(extruct)
+        for page in self._slotsOfPid.get(pid, dict()):
+            res.append(PageSwapping(pid, page, list(self.readSlot(pid, page))))
         return res
 
+    ## vista (sin copiar) de la pagina guardada en el archivo
+    def readSlot(self, pid, page):
+        slot, cant = self._slotsOfPid[pid][page]
+        start = slot * self._pageSize
+        return memoryview(self._map)[start:start + cant]
+
+    ## retorna la pagina y libera su slot
+    ## la vista retornada es valida hasta el proximo swapIn
     def swapOut(self, pid, page):
-        pages = self.pagesOfPid(pid)
-        for pag in pages:
-            if pag.page() == page:
-                return pag.instructions()
+        pages = self._slotsOfPid.get(pid)
+        if pages == None or page not in pages:
+            return None
+        ins = self.readSlot(pid, page)
+        self._freeSlots.append(pages.pop(page)[0])
+        if len(pages) == 0:
+            del self._slotsOfPid[pid]
+        return ins
 
     def clear(self, pid):
-        rows = self.pagesOfPid(pid)
-        for row in rows:
-            self.queuePages().remove(row)
+        pages = self._slotsOfPid.pop(pid, None)
+        if pages != None:
+            for slot, cant in pages.values():
+                self._freeSlots.append(slot)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
 
     def __repr__(self):
-        return "(" + "SWAPPING ={queue}".format(queue=self._queuePages) + ")"
+        return "(" + "FILE SWAPPING ={pages}".format(pages=self._slotsOfPid) + " OCCUPANCY={occupancy}/{slots}".format(occupancy=self.occupancy(), slots=self._slots) + ")"
 
 class Disk():
 
@@ -264,14 +764,9 @@ class Disk():
         return self.programs().get(patch)
 
     def returnInstructions(self, path, index, cant):
-        res = []
-        var = index + cant
-        program = self.getProgram(path).instructions
-        log.logger.info("Programa: " + str(program))
-        while index < var and index < len(program):
-            res.append(self.getProgram(path).instructions[index])
-            index = index + 1
-        return res
+        program = self.getProgram(path)
+        log.logger.info("Programa: %s", program)
+        return program.instructionsFrom(index, cant)
 
 ## emulates the main Central Processor Unit
 class Cpu():
@@ -281,14 +776,16 @@ class Cpu():
         self._interruptVector = interruptVector
         self._pc = -1
         self._ir = None
-
+        ## tabla de dispatch indexada por opcode (los opcodes despues de EXIT son IO a otros devices)
+        self._operations = [self._executeCPU, self._executeCPU, self._executeIO, self._executeEXIT] \
+                           + [self._executeIO] * (INSTRUCTION_MAX - INSTRUCTION_EXIT)
 
     def tick(self, tickNbr):
         if (self._pc > -1):
             self._fetch()
             self._decode()
             self._execute()
-        else:
+        elif log.infoEnabled():
             log.logger.info("cpu - NOOP")
 
 
@@ -301,16 +798,41 @@ class Cpu():
         pass
 
     def _execute(self):
-        if ASM.isEXIT(self._ir):
-            killIRQ = IRQ(KILL_INTERRUPTION_TYPE)
-            self._interruptVector.handle(killIRQ)
-        elif ASM.isIO(self._ir):
-            ioInIRQ = IRQ(IO_IN_INTERRUPTION_TYPE, self._ir)
-            self._interruptVector.handle(ioInIRQ)
-        else:
-            log.logger.info("cpu - Exec: {instr}, PC={pc}".format(instr=self._ir, pc=self._pc))
+        self._operations[self._ir]()
+
+    def _executeEXIT(self):
+        killIRQ = IRQ(KILL_INTERRUPTION_TYPE)
+        self._interruptVector.raiseIRQ(killIRQ)
+
+    def _executeIO(self):
+        ioInIRQ = IRQ(IO_IN_INTERRUPTION_TYPE, self._ir)
+        self._interruptVector.raiseIRQ(ioInIRQ)
+
+    def _executeCPU(self):
+        if log.infoEnabled():
+            log.logger.info("cpu - Exec: %s, PC=%s", ASM.name(self._ir), self._pc)
 
 
+    ## cantidad de instrucciones CPU que se pueden ejecutar de corrido desde el pc actual
+    def burstLength(self):
+        if (self._pc > -1):
+            return self._mmu.cpuRunLength(self._pc)
+        return 0
+
+    ## ejecuta de una vez una rafaga de instrucciones CPU (ver burstLength)
+    ## queda el mismo estado que ejecutando times ticks de a uno
+    def runBurst(self, times):
+        ## la rafaga pudo cambiar desde que se calculo (ej. un cambio de contexto): se recorta a la actual
+        times = min(times, self.burstLength())
+        if times <= 0:
+            return
+        ## la rafaga no sale de la pagina, se registran todos los accesos de una vez
+        self._mmu.reference(self._pc, times)
+        self._pc += times
+        self._ir = INSTRUCTION_CPU
+        if log.infoEnabled():
+            log.logger.info("cpu - Exec burst: %s x %s, PC=%s", times, ASM.name(self._ir), self._pc)
+
     def isBusy(self):
         return self._pc != -1
 
@@ -346,9 +868,18 @@ class AbstractIODevice():
     def is_idle(self):
         return not self._busy
 
+    ## cantidad de pistas (0 si el device no tiene seek) y posicion del brazo
+    @property
+    def tracks(self):
+        return 0
+
+    @property
+    def head(self):
+        return 0
 
     ## executes an I/O instruction
-    def execute(self, operation):
+    ## track: pista de la operacion, solo la usan los devices con seek
+    def execute(self, operation, track = 0):
         if (self._busy):
             raise Exception("Device {id} is busy, can't  execute operation: {op}".format(id = self.deviceId, op = operation))
         else:
@@ -363,14 +894,57 @@ class AbstractIODevice():
                 ## operation execution has finished
                 self._busy = False
                 ioOutIRQ = IRQ(IO_OUT_INTERRUPTION_TYPE, self._deviceId)
-                HARDWARE.interruptVector.handle(ioOutIRQ)
-            else:
-                log.logger.info("device {deviceId} - Busy: {ticksCount} of {deviceTime}".format(deviceId = self.deviceId, ticksCount = self._ticksCount, deviceTime = self._deviceTime))
+                HARDWARE.interruptVector.raiseIRQ(ioOutIRQ)
+            elif log.infoEnabled():
+                log.logger.info("device %s - Busy: %s of %s", self._deviceId, self._ticksCount, self._deviceTime)
+
+    ## ticks que faltan hasta que termine la operacion en curso (None si esta ocioso)
+    def ticksToNextEvent(self):
+        if (self._busy):
+            return self._deviceTime - self._ticksCount + 1
+        return None
+
+    ## avanza ticks en los que el device no termina su operacion
+    def skip(self, ticks):
+        if (self._busy):
+            self._ticksCount += ticks
 
 class PrinterIODevice(AbstractIODevice):
     def __init__(self):
         super(PrinterIODevice, self).__init__("Printer", 3)
 
+class DiskIODevice(AbstractIODevice):
+    def __init__(self):
+        super(DiskIODevice, self).__init__("Disk", 5)
+
+class NetworkIODevice(AbstractIODevice):
+    def __init__(self):
+        super(NetworkIODevice, self).__init__("Network", 2)
+
+## disco con brazo: cada operacion tarda deviceTime mas seekTime por pista que se mueve el brazo
+class SeekDiskIODevice(AbstractIODevice):
+    def __init__(self, deviceId = "SeekDisk", deviceTime = 2, tracks = 16, seekTime = 1):
+        super(SeekDiskIODevice, self).__init__(deviceId, deviceTime)
+        self._baseTime = deviceTime
+        self._tracks = tracks
+        self._seekTime = seekTime
+        self._head = 0
+
+    @property
+    def tracks(self):
+        return self._tracks
+
+    @property
+    def head(self):
+        return self._head
+
+    def execute(self, operation, track = 0):
+        if (self._busy):
+            raise Exception("Device {id} is busy, can't  execute operation: {op}".format(id = self.deviceId, op = operation))
+        self._deviceTime = self._baseTime + abs(track - self._head) * self._seekTime
+        self._head = track
+        super(SeekDiskIODevice, self).execute(operation, track)
+
 class Timer:
 
     def __init__(self, cpu, interruptVector):
@@ -379,21 +953,45 @@ class Timer:
         self._tickCount = 0    # cantidad de de ciclos “ejecutados” por el proceso actual
         self._active = False    # por default esta desactivado
         self._quantum = 0   # por default esta desactivado
+        self._totalTicks = 0    # ciclos desde que se creo el timer (no se resetea)
 
     def tick(self, tickNbr):
         # registro que el proceso en CPU corrio un ciclo mas
         self._tickCount += 1
+        self._totalTicks += 1
 
-        if self._active and (self._tickCount > self._quantum) and self._cpu.isBusy():
+        if self._active and (self._tickCount > self._quantum) and self._cpu.isBusy() \
+                and not self._interruptVector.isMasked(TIMEOUT_INTERRUPTION_TYPE):
             # se “cumplio” el limite de ejecuciones
             timeoutIRQ = IRQ(TIMEOUT_INTERRUPTION_TYPE)
-            self._interruptVector.handle(timeoutIRQ)
+            self._interruptVector.raiseIRQ(timeoutIRQ)
         else:
             self._cpu.tick(tickNbr)
 
+    ## con el cpu ocupado el proximo evento es el fin de la rafaga de instrucciones CPU
+    ## (IO, EXIT, cambio de pagina o fin del quantum), si esta ocioso no hay ninguno
+    def ticksToNextEvent(self):
+        if not self._cpu.isBusy():
+            return None
+        burst = self._cpu.burstLength()
+        if self._active:
+            burst = max(0, min(burst, self._quantum - self._tickCount))
+        return burst + 1
+
+    ## avanza ticks sin eventos: se registran los ciclos y el cpu ejecuta la rafaga
+    def skip(self, ticks):
+        self._tickCount += ticks
+        self._totalTicks += ticks
+        if self._cpu.isBusy():
+            self._cpu.runBurst(ticks)
+
     def reset(self):
            self._tickCount = 0
 
+    @property
+    def totalTicks(self):
+        return self._totalTicks
+
     @property
     def quantum(self):
         return self._quantum
@@ -403,21 +1001,90 @@ class Timer:
         self._active = True
         self._quantum = quantum
 
+## emulates a core: its own Cpu, MMU (with its TLB) and Timer
+class Core():
+
+    def __init__(self, coreId, memory, interruptVector, tlbSize, frameBits):
+        self._coreId = coreId
+        self._mmu = MMU(memory, tlbSize, frameBits)
+        self._cpu = Cpu(self._mmu, interruptVector)
+        self._timer = Timer(self._cpu, interruptVector)
+
+    @property
+    def coreId(self):
+        return self._coreId
+
+    @property
+    def cpu(self):
+        return self._cpu
+
+    @property
+    def mmu(self):
+        return self._mmu
+
+    @property
+    def timer(self):
+        return self._timer
+
+    ## las interrupciones del tick las atiende el so con este nucleo como nucleo actual
+    def tick(self, tickNbr):
+        HARDWARE.selectCore(self._coreId)
+        self._timer.tick(tickNbr)
+
+    def ticksToNextEvent(self):
+        return self._timer.ticksToNextEvent()
+
+    def skip(self, ticks):
+        HARDWARE.selectCore(self._coreId)
+        self._timer.skip(ticks)
+
+    def __repr__(self):
+        return "Core {coreId}: {cpu}".format(coreId=self._coreId, cpu=self._cpu)
+
 ## emulates the Hardware that were the Operative System run
 class Hardware():
 
     ## Setup our hardware
-    def setup(self, memorySize):
+    ## fastForward: el clock saltea los ticks sin eventos y no espera entre ticks
+    ## tickPeriod: segundos de espera entre ticks (0 = sin espera)
+    ## tlbSize: cantidad de entradas de la TLB (de cada nucleo)
+    ## cores: cantidad de nucleos, cada uno con su cpu, mmu y timer
+    ## ioDevices: devices del registro, el numero de cada uno es su posicion (por defecto Printer, Disk y Network)
+    def setup(self, memorySize, fastForward = False, tickPeriod = 1, tlbSize = 16, cores = 1, ioDevices = None):
         ## add the components to the "motherboard"
         self._memory = Memory(memorySize)
         self._interruptVector = InterruptVector()
-        self._clock = Clock()
-        self._ioDevice = PrinterIODevice()
-        self._mmu = MMU(self._memory)
-        self._cpu = Cpu(self._mmu, self._interruptVector)
-        self._timer = Timer(self._cpu, self._interruptVector)
-        self._clock.addSubscriber(self._ioDevice)
-        self._clock.addSubscriber(self._timer)
+        self._clock = Clock(fastForward, tickPeriod, self._interruptVector)
+        ## registro de devices: numero -> device y deviceId -> numero
+        self._ioDevices = []
+        self._numberOfDevice = dict()
+        if ioDevices == None:
+            ioDevices = [PrinterIODevice(), DiskIODevice(), NetworkIODevice()]
+        for ioDevice in ioDevices:
+            self.registerDevice(ioDevice)
+        frameBits = FrameBits()
+        self._cores = []
+        for coreId in range(0, cores):
+            self._cores.append(Core(coreId, self._memory, self._interruptVector, tlbSize, frameBits))
+        ## nucleo actual de cada thread: cpu, mmu y timer son los de este nucleo
+        self._current = local()
+        for core in self._cores:
+            self._clock.addSubscriber(core)
+
+    ## agrega un device al registro (y al clock) y retorna su numero (el que usa ASM.IO)
+    def registerDevice(self, ioDevice):
+        if ioDevice.deviceId in self._numberOfDevice:
+            raise Exception("Device {id} is already registered".format(id = ioDevice.deviceId))
+        self._numberOfDevice[ioDevice.deviceId] = len(self._ioDevices)
+        self._ioDevices.append(ioDevice)
+        self._clock.addSubscriber(ioDevice)
+        return len(self._ioDevices) - 1
+
+    def device(self, number):
+        return self._ioDevices[number]
+
+    def deviceNumber(self, deviceId):
+        return self._numberOfDevice[deviceId]
 
     def switchOn(self):
         log.logger.info(" ---- SWITCH ON ---- ")
@@ -427,9 +1094,21 @@ class Hardware():
         self.clock.stop()
         log.logger.info(" ---- SWITCH OFF ---- ")
 
+    @property
+    def cores(self):
+        return self._cores
+
+    ## nucleo actual del thread (por defecto el 0)
+    @property
+    def core(self):
+        return getattr(self._current, "core", self._cores[0])
+
+    def selectCore(self, coreId):
+        self._current.core = self._cores[coreId]
+
     @property
     def cpu(self):
-        return self._cpu
+        return self.core.cpu
 
     @property
     def clock(self):
@@ -445,20 +1124,25 @@ class Hardware():
 
     @property
     def mmu(self):
-        return self._mmu
+        return self.core.mmu
 
+    ## device 0 del registro
     @property
     def ioDevice(self):
-        return self._ioDevice
+        return self._ioDevices[0]
+
+    @property
+    def ioDevices(self):
+        return self._ioDevices
 
 
     @property
     def timer(self):
-        return self._timer
+        return self.core.timer
 
 
     def __repr__(self):
-        return "HARDWARE state {cpu}\n{mem}".format(cpu=self._cpu, mem=self._memory)
+        return "HARDWARE state {cores}\n{mem}".format(cores=self._cores, mem=self._memory)
 
 ### HARDWARE is a global variable
 ### can be access from any
@@ -2,10 +2,30 @@ import logging
 
 logger = logging.getLogger()
 
-def setupLogger():
+## nivel del modo silencioso: no se emite nada
+QUIET = logging.CRITICAL + 10
+
+## los logs del camino caliente (cada tick) se guardan con estas consultas para no formatear
+## ni llamar al logger si no se van a emitir; isEnabledFor ya cachea el nivel efectivo,
+## asi que siguen cualquier cambio de nivel (setLevel, logging.basicConfig, logger.setLevel)
+def infoEnabled():
+    return logger.isEnabledFor(logging.INFO)
+
+def debugEnabled():
+    return logger.isEnabledFor(logging.DEBUG)
+
+## level: nivel de logging (por defecto INFO, con DEBUG se loguea la memoria completa)
+## quiet: modo silencioso de la simulacion, no se emite ni se formatea ningun log
+def setupLogger(level = logging.INFO, quiet = False):
     ## Configure Logger
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter('%(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    logger.setLevel(logging.DEBUG)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(message)s')
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    if quiet:
+        level = QUIET
+    setLevel(level)
+
+def setLevel(level):
+    logger.setLevel(level)
@@ -1,52 +1,115 @@
 #!/usr/bin/env python
 import sys
+from bisect import bisect_left, bisect_right, insort
+from itertools import groupby
+from collections import deque, OrderedDict
+from heapq import heappush, heappop
 
 from hardware import *
 import log
 
 ## emulates a compiled program
+## las instrucciones se guardan como runs [instruccion, cantidad] (run-length encoding)
 class Program():
 
     def __init__(self,  instructions):
-        self._instructions = self.expand(instructions)
+        self._runs = []
+        ## direccion donde empieza cada run, para buscar con bisect
+        self._starts = []
+        self._size = 0
+        self.compile(instructions)
 
+    ## vista expandida (una instruccion por direccion) para el codigo que la necesite
     @property
     def instructions(self):
-        return self._instructions
+        return self.instructionsFrom(0, self._size)
+
+    def runs(self):
+        return self._runs
+
+    def getSize(self):
+        return self._size
 
     def addInstr(self, instruction):
-        self._instructions.append(instruction)
+        self.addRun(instruction, 1)
+
+    ## las rafagas vacias no se guardan: dos runs seguidos siempre tienen distinta instruccion
+    def addRun(self, instruction, times):
+        if times <= 0:
+            return
+        if len(self._runs) > 0 and self._runs[-1][0] == instruction:
+            self._runs[-1][1] += times
+        else:
+            self._runs.append([instruction, times])
+            self._starts.append(self._size)
+        self._size += times
 
-    def expand(self, instructions):
-        expanded = []
+    def compile(self, instructions):
         for i in instructions:
-            if isinstance(i, list):
+            if isinstance(i, tuple):
+                ## is a run (opcode, times), ej. ASM.CPU(times)
+                self.addRun(i[0], i[1])
+            elif isinstance(i, list):
                 ## is a list of instructions
-                expanded.extend(i)
+                for instruction, group in groupby(i):
+                    self.addRun(instruction, sum(1 for _ in group))
             else:
-                ## a single instr (a String)
-                expanded.append(i)
+                ## a single instr (an opcode)
+                self.addInstr(i)
 
         ## now test if last instruction is EXIT
         ## if not... add an EXIT as final instruction
-        last = expanded[-1]
-        if not ASM.isEXIT(last):
-            expanded.append(INSTRUCTION_EXIT)
-
-        return expanded
+        if len(self._runs) == 0 or not ASM.isEXIT(self._runs[-1][0]):
+            self.addInstr(INSTRUCTION_EXIT)
+
+    ## ticks de CPU desde addr hasta dejar el cpu (incluye la proxima IO o EXIT), O(log runs)
+    def burstAt(self, addr):
+        run = bisect_right(self._starts, addr) - 1
+        instruction, times = self._runs[run]
+        if not ASM.isCPU(instruction):
+            return 1
+        return self._starts[run] + times - addr + 1
+
+    ## instruccion de la direccion addr, O(log runs)
+    def instructionAt(self, addr):
+        if addr < 0 or addr >= self._size:
+            raise IndexError("Program address {addr} out of range".format(addr=addr))
+        return self._runs[bisect_right(self._starts, addr) - 1][0]
+
+    ## hasta cant instrucciones a partir de index (menos si se termina el programa)
+    def instructionsFrom(self, index, cant):
+        res = []
+        end = min(index + cant, self._size)
+        if index >= end:
+            return res
+        run = bisect_right(self._starts, index) - 1
+        while index < end:
+            instruction, times = self._runs[run]
+            runEnd = min(self._starts[run] + times, end)
+            res.extend([instruction] * (runEnd - index))
+            index = runEnd
+            run += 1
+        return res
 
     def __repr__(self):
-        return "Program({instructions})".format( instructions=self._instructions)
+        return "Program({runs})".format(runs=[[ASM.name(instruction), times] for instruction, times in self._runs])
 
 class PCB():
 
-    def __init__(self, pid,  path, priority):
+    ## peso de la prioridad 0, cada nivel de prioridad pesa 1.25 veces menos
+    NICE_0_WEIGHT = 1024
+
+    def __init__(self, pid,  path, priority, program = None):
         self._pid = pid
         #self._baseDir = db
         self._pc = 0
         self._state = "New"
         self._path = path
         self._priority = priority
+        self._program = program
+        ## ticks en cpu y ticks en cpu pesados por la prioridad (runtime virtual)
+        self._cpuTime = 0
+        self._vruntime = 0
 
     # ----------------Getters---------------------------------------------------------
     def getPc(self):
@@ -68,6 +131,24 @@ class PCB():
     def getPriority(self):
         return self._priority
 
+    def getProgram(self):
+        return self._program
+
+    def getCpuTime(self):
+        return self._cpuTime
+
+    def getVruntime(self):
+        return self._vruntime
+
+    def weight(self):
+        return max(1, int(self.NICE_0_WEIGHT / (1.25 ** self._priority)))
+
+    ##Ticks de CPU que le quedan hasta la proxima IO (o EXIT) desde el pc
+    def remainingBurst(self, pc = None):
+        if pc == None:
+            pc = self._pc
+        return self._program.burstAt(pc)
+
     # ----------------Setters----------------------------------------------------------
 
     def setPc(self, pc):
@@ -76,6 +157,14 @@ class PCB():
     def setState(self, state):
         self._state = state
 
+    def setVruntime(self, vruntime):
+        self._vruntime = vruntime
+
+    ##Suma ticks en cpu, el runtime virtual avanza mas lento cuanto mas peso tiene el pcb
+    def addCpuTime(self, ticks):
+        self._cpuTime += ticks
+        self._vruntime += ticks * self.NICE_0_WEIGHT / self.weight()
+
     def __repr__(self):
         return "(" + "PDI={pdi}".format(pdi=self._pid) + " PC={pc}".format(pc=self._pc) + " STATE={state}".format(state=self._state)  + " PATCH={path}".format(path=self._path) + " PRIORIDAD={pri}".format(
             pri=self._priority) + ")"
@@ -84,7 +173,8 @@ class PcbTable():
 
     def __init__(self):
         self._pcbs = dict()
-        self._running = None
+        ## pcb que corre en cada nucleo (coreId -> pcb)
+        self._running = dict()
         self._countPid = 0
 
     # ----------------------- Getters ------------------------------------------------
@@ -94,15 +184,28 @@ class PcbTable():
     def updatePC(self, k, pc):
         self.returnPCB(k).setPc(pc)
 
+    ##Pcb que corre en el nucleo actual
     def returnRunning(self):
-        return self._running
+        return self._running.get(HARDWARE.core.coreId)
+
+    def runningOfCore(self, coreId):
+        return self._running.get(coreId)
+
+    ##Un nucleo sin pcb corriendo, primero el actual (None si estan todos ocupados)
+    def idleCore(self):
+        if self.returnRunning() == None:
+            return HARDWARE.core.coreId
+        for core in HARDWARE.cores:
+            if self._running.get(core.coreId) == None:
+                return core.coreId
+        return None
 
     def updateState(self, k, state):
         self.returnPCB(k).setState(state)
 
     # ----------------------- Setters ------------------------------------------------
-    def createPcb(self, path, priority):
-        pcb = PCB(self._countPid,  path, priority)
+    def createPcb(self, path, priority, program = None):
+        pcb = PCB(self._countPid,  path, priority, program)
         self.addPcb(pcb)
         self.increasePID()
         return pcb
@@ -111,37 +214,163 @@ class PcbTable():
         self._countPid += 1
 
     def setRunning(self, pcb):
-        self._running = pcb
+        self._running[HARDWARE.core.coreId] = pcb
 
     def addPcb(self, pcb):
         self._pcbs[pcb.getPid()] = pcb
 
     def runningPCB(self, pcb):
-        self._running = pcb
+        self._running[HARDWARE.core.coreId] = pcb
 
     def noneRunning(self):
-        self._running = None
+        self._running[HARDWARE.core.coreId] = None
+
+    ##Hay algun pcb que todavia no termino
+    def hasActivePCB(self):
+        for pcb in self._pcbs.values():
+            if pcb.getState() == "New" or pcb.getState() == "Waiting":
+                return True
+        return False
 
     def __repr__(self):
         return "(" + "TABLE ={table}".format(table=self._pcbs) + ")"
 
+## pedido de IO: el pcb, la instruccion, la pista (en devices con seek) y el orden de llegada
+class IoRequest():
+    __slots__ = ('pcb', 'instruction', 'track', 'entry')
+
+    def __init__(self, pcb, instruction, track, entry):
+        self.pcb = pcb
+        self.instruction = instruction
+        self.track = track
+        self.entry = entry
+
+    def __repr__(self):
+        return "(PID={pid} TRACK={track})".format(pid=self.pcb.getPid(), track=self.track)
+
+## disciplina de la cola de espera de un IoDeviceController
+class AbstractIoQueue():
+
+    def add(self, request):
+        log.logger.error("-- add MUST BE OVERRIDEN in class {classname}".format(classname=self.__class__.__name__))
+
+    ##Proximo pedido a ejecutar en el device (la cola no esta vacia)
+    def returnNext(self, device):
+        log.logger.error("-- returnNext MUST BE OVERRIDEN in class {classname}".format(classname=self.__class__.__name__))
+
+    def requests(self):
+        log.logger.error("-- requests MUST BE OVERRIDEN in class {classname}".format(classname=self.__class__.__name__))
+
+    def noIsEmpty(self):
+        log.logger.error("-- noIsEmpty MUST BE OVERRIDEN in class {classname}".format(classname=self.__class__.__name__))
+
+    def __repr__(self):
+        return str(self.requests())
+
+## por orden de llegada
+class IoQueueFIFO(AbstractIoQueue):
+
+    def __init__(self):
+        self._queue = deque()
+
+    def add(self, request):
+        self._queue.append(request)
+
+    def returnNext(self, device):
+        return self._queue.popleft()
+
+    def requests(self):
+        return list(self._queue)
+
+    def noIsEmpty(self):
+        return len(self._queue) > 0
+
+## por prioridad del pcb (heap), a igual prioridad por orden de llegada
+class IoQueuePriority(AbstractIoQueue):
+
+    def __init__(self):
+        self._queue = []
+
+    def add(self, request):
+        heappush(self._queue, (request.pcb.getPriority(), request.entry, request))
+
+    def returnNext(self, device):
+        return heappop(self._queue)[2]
+
+    def requests(self):
+        return [request for priority, entry, request in sorted(self._queue)]
+
+    def noIsEmpty(self):
+        return len(self._queue) > 0
+
+## ascensor para un device con seek (ej. SeekDiskIODevice): el brazo atiende los pedidos en el
+## sentido en el que se mueve y cambia de sentido cuando no quedan pedidos adelante (LOOK)
+## lista de (pista, entrada, pedido) ordenada por pista
+class IoQueueSCAN(AbstractIoQueue):
+
+    def __init__(self):
+        self._queue = []
+        self._up = True
+
+    def add(self, request):
+        insort(self._queue, (request.track, request.entry, request))
+
+    def returnNext(self, device):
+        head = device.head
+        if self._up:
+            ##primer pedido con pista >= head
+            index = bisect_left(self._queue, (head,))
+            if index == len(self._queue):
+                self._up = False
+                return self.returnNext(device)
+        else:
+            ##ultima pista <= head, el primero que llego a esa pista
+            index = bisect_right(self._queue, (head, float("inf"))) - 1
+            if index < 0:
+                self._up = True
+                return self.returnNext(device)
+            index = bisect_left(self._queue, (self._queue[index][0],))
+        return self._queue.pop(index)[2]
+
+    def requests(self):
+        return [request for track, entry, request in self._queue]
+
+    def noIsEmpty(self):
+        return len(self._queue) > 0
+
 ## emulates an Input/Output device controller (driver)
+## queue: disciplina de la cola de espera (por defecto IoQueueFIFO)
 class IoDeviceController():
 
-    def __init__(self, device):
+    def __init__(self, device, queue = None):
         self._device = device
-        self._waiting_queue = []
+        self._waiting_queue = queue
+        if queue == None:
+            self._waiting_queue = IoQueueFIFO()
         self._currentPCB = None
+        self._nextEntry = 0
 
     def runOperation(self, pcb, instruction):
-        pair = {'pcb': pcb, 'instruction': instruction}
-        # append: adds the element at the end of the queue
-        self._waiting_queue.append(pair)
+        self.addRequest(pcb, instruction)
         # try to send the instruction to hardware's device (if is idle)
         self.__load_from_waiting_queue_if_apply()
 
+    def addRequest(self, pcb, instruction):
+        track = 0
+        if self._device.tracks > 0:
+            track = self.trackOf(pcb)
+        self._waiting_queue.add(IoRequest(pcb, instruction, track, self._nextEntry))
+        self._nextEntry += 1
+
+    ##Pista que lee el pcb: el bloque depende del proceso y de por donde va (no hay archivos reales)
+    def trackOf(self, pcb):
+        return (pcb.getPid() * 37 + pcb.getPc() * 7) % self._device.tracks
+
     def waitingQueue(self):
-        return self._waiting_queue
+        return self._waiting_queue.requests()
+
+    def hasWaiting(self):
+        return self._waiting_queue.noIsEmpty()
 
     def getFinishedPCB(self):
         finishedPCB = self._currentPCB
@@ -150,15 +379,14 @@ class IoDeviceController():
         return finishedPCB
 
     def __load_from_waiting_queue_if_apply(self):
-        if (len(self._waiting_queue) > 0) and self._device.is_idle:
-            pair = self._waiting_queue.pop(0)
-            pcb = pair['pcb']
-            instruction = pair['instruction']
-            self._currentPCB = pcb
-            self._device.execute(instruction)
+        ##el device puede estar libre antes de que se atienda su IO_OUT (ej. si esta enmascarada)
+        if self._waiting_queue.noIsEmpty() and self._device.is_idle and self._currentPCB == None:
+            request = self._waiting_queue.returnNext(self._device)
+            self._currentPCB = request.pcb
+            self._device.execute(request.instruction, request.track)
 
     def loadToWaitingQueue(self, pcb):
-        self._waiting_queue.append(pcb)
+        self.addRequest(pcb, INSTRUCTION_IO)
 
     def __repr__(self):
         return "IoDeviceController for {deviceID} running: {currentPCB} waiting: {waiting_queue}".format(
@@ -192,32 +420,42 @@ class AbstractInterruptionHandler():
     def fileSystem(self):
         return self._fileSystem
 
-    def selectWhereToAdd(self, pcb):
-        pageOfPCB = self.memoryManager().pageTable().returnRowsOfPID(pcb.getPid())
+    ##Memoria en el log: la tabla completa solo en DEBUG, en INFO solo los frames que cambiaron
+    def logMemory(self):
+        if log.debugEnabled():
+            log.logger.debug("%s", HARDWARE.memory)
+        elif log.infoEnabled():
+            log.logger.info("Memory changes:\n%s", HARDWARE.memory.dumpChanged())
 
-        if self.table().returnRunning() == None:
+    ##Si hay un nucleo libre el pcb corre ahi, si no se encola (o expropia) en el nucleo actual
+    def selectWhereToAdd(self, pcb):
+        coreId = self.table().idleCore()
+        if coreId != None:
+            current = HARDWARE.core.coreId
+            HARDWARE.selectCore(coreId)
             self.table().setRunning(pcb)
-            self.dispatcher().load(pcb,pageOfPCB)
+            self.dispatcher().load(pcb)
             self.table().runningPCB(pcb)
+            HARDWARE.selectCore(current)
         else:
-            self.isExpropiationScheduler(pcb, pageOfPCB)
+            self.isExpropiationScheduler(pcb)
 
-    def isExpropiationScheduler(self,pcb,pageOfPCB):
+    def isExpropiationScheduler(self, pcb):
         if self.scheduler().isExpropiation():
-            self.caseExpropiation(pcb,pageOfPCB)
+            self.caseExpropiation(pcb)
         else:
             self.scheduler().add(pcb)
 
-    def caseExpropiation(self, pcb,pageOfPCB):
-        if pcb.getPriority() < self.table().returnRunning().getPriority():
-            self.expropiate(pcb,pageOfPCB)
+    def caseExpropiation(self, pcb):
+        if self.scheduler().hasPriorityOver(pcb, self.table().returnRunning()):
+            self.expropiate(pcb)
         else:
             self.scheduler().add(pcb)
 
-    def expropiate(self, pcb,pageOfPCB):
+    def expropiate(self, pcb):
         self.dispatcher().save(self.table().returnRunning())
         self.scheduler().add(self.table().returnRunning())
-        self.dispatcher().load(pcb,pageOfPCB)
+        self.dispatcher().load(pcb)
         self.table().runningPCB(pcb)
 
 class KillInterruptionHandler(AbstractInterruptionHandler):
@@ -235,6 +473,8 @@ class KillInterruptionHandler(AbstractInterruptionHandler):
                 self.memoryManager().listVictim().removeVictim(row)
         self.memoryManager().addFrames(framesFree)
         self.fileSystem().clearSwapping(pid)
+        for core in HARDWARE.cores:
+            core.mmu.flushASID(pid)
 
 
     def execute(self, irq):
@@ -244,43 +484,44 @@ class KillInterruptionHandler(AbstractInterruptionHandler):
         ###Elimino las paginas del proceso en el swapping
         pid = self.table().returnRunning().getPid()
         self.saveFrames(pid)
-        log.logger.info("List of victim in KILL: " + str(self.memoryManager().listVictim()))
+        log.logger.info("List of victim in KILL: %s", self.memoryManager().listVictim())
         self.table().returnRunning().setState("Finished")
-        log.logger.info("FREE FRAMES: " + str(self.memoryManager().freeFrames()))
+        log.logger.info("FREE FRAMES: %s", self.memoryManager().freeFrames())
 
         if self.scheduler().noIsEmpty():
             pcb = self.scheduler().returnNext()
-            pageOfPCB = self.memoryManager().pageTable().returnRowsOfPID(pcb.getPid())
-            self.dispatcher().load(pcb, pageOfPCB)
+            self.dispatcher().load(pcb)
             self.table().runningPCB(pcb)
 
         else:
             self.table().noneRunning()
 
-        log.logger.info("SWAPPING: " + str(self.fileSystem().swapping()))
-        log.logger.info("PCB TABLE: " + str(self.table()))
+        log.logger.info("SWAPPING: %s", self.fileSystem().swapping())
+        log.logger.info("PCB TABLE: %s", self.table())
 
 class IoInInterruptionHandler(AbstractInterruptionHandler):
 
-    def __init__(self, table, scheduler, dispatcher, ioDevice, memoryManager,fileSystem):
+    ##ioDevices: deviceId -> IoDeviceController
+    def __init__(self, table, scheduler, dispatcher, ioDevices, memoryManager,fileSystem):
         super(IoInInterruptionHandler, self).__init__(table, scheduler, dispatcher, memoryManager, fileSystem)
-        self._ioDeviceController = ioDevice
+        self._ioDeviceControllers = ioDevices
 
-    def ioDeviceController(self):
-        return self._ioDeviceController
+    def ioDeviceController(self, deviceId):
+        return self._ioDeviceControllers[deviceId]
 
     def execute(self, irq):
         log.logger.info(" Program IN ")
-        log.logger.info("waitin queue" + str(self.ioDeviceController()))
         operation = irq.parameters
+        ##La instruccion IO dice a que device va
+        deviceId = HARDWARE.device(ASM.deviceOf(operation)).deviceId
+        log.logger.info("waitin queue %s", self.ioDeviceController(deviceId))
         self.dispatcher().save(self.table().returnRunning())
-        self.ioDeviceController().runOperation(self.table().returnRunning(), operation)
+        self.ioDeviceController(deviceId).runOperation(self.table().returnRunning(), operation)
         self.table().noneRunning()
         HARDWARE.cpu.pc = -1
         if self.scheduler().noIsEmpty():
             pcb = self.scheduler().returnNext()
-            pageOfPCB = self.memoryManager().pageTable().returnRowsOfPID(pcb.getPid())
-            self.dispatcher().load(pcb, pageOfPCB)
+            self.dispatcher().load(pcb)
             self.table().runningPCB(pcb)
 
         else:
@@ -288,18 +529,21 @@ class IoInInterruptionHandler(AbstractInterruptionHandler):
 
 class IoOutInterruptionHandler(AbstractInterruptionHandler):
 
-    def __init__(self, table, scheduler, dispatcher, ioDevice, memoryManager, fileSystem):
+    ##ioDevices: deviceId -> IoDeviceController
+    def __init__(self, table, scheduler, dispatcher, ioDevices, memoryManager, fileSystem):
         super(IoOutInterruptionHandler, self).__init__(table, scheduler, dispatcher,memoryManager,fileSystem)
-        self._ioDeviceController = ioDevice
+        self._ioDeviceControllers = ioDevices
 
-    def ioDeviceController(self):
-        return self._ioDeviceController
+    def ioDeviceController(self, deviceId):
+        return self._ioDeviceControllers[deviceId]
 
     def execute(self, irq):
         log.logger.info(" Program Out")
-        log.logger.info("PCB : " + str(self.table().returnRunning()))
-        pcb = self.ioDeviceController().getFinishedPCB()
-        log.logger.info(self.ioDeviceController())
+        log.logger.info("PCB : %s", self.table().returnRunning())
+        ##El parametro de la IRQ es el deviceId del device que termino
+        deviceId = irq.parameters
+        pcb = self.ioDeviceController(deviceId).getFinishedPCB()
+        log.logger.info(self.ioDeviceController(deviceId))
         self.selectWhereToAdd(pcb)
 
 class NewInterruptionHandler(AbstractInterruptionHandler):
@@ -314,17 +558,18 @@ class NewInterruptionHandler(AbstractInterruptionHandler):
     def execute(self, irq):
         log.logger.info(" New PCB ")
         path = irq.parameters[0]
-        cant = len(self.fileSystem().read(path).instructions)
-        log.logger.info("Len del Programa: " + str(cant))
+        program = self.fileSystem().read(path)
+        cant = program.getSize()
+        log.logger.info("Len del Programa: %s", cant)
         pri = irq.parameters[1]
-        pcb = self.table().createPcb( path, pri) #self.loader().getDirBase(),
+        pcb = self.table().createPcb( path, pri, program) #self.loader().getDirBase(),
         ##Cargo las paginas en la pageTable
         self.loader().load(path, pcb.getPid())
         #Pongo a correr al pcb
         self.selectWhereToAdd(pcb)
         ##Prints
-        log.logger.info(HARDWARE.memory)
-        log.logger.info("PAGETABLE: " + str(self.memoryManager().pageTable()))
+        self.logMemory()
+        log.logger.info("PAGETABLE: %s", self.memoryManager().pageTable())
 
 class TimeOutInterruptionHandler(AbstractInterruptionHandler):
 
@@ -337,7 +582,8 @@ class TimeOutInterruptionHandler(AbstractInterruptionHandler):
             self.changePCB()
         else:
             self.resetQuantum()
-        log.logger.info("ReadyQueue" + str(self.scheduler().readyQueue()))
+        if log.infoEnabled():
+            log.logger.info("ReadyQueue %s", self.scheduler().readyQueue())
 
     def resetQuantum(self):
         HARDWARE.timer.reset()
@@ -346,8 +592,7 @@ class TimeOutInterruptionHandler(AbstractInterruptionHandler):
         pcb = self.scheduler().returnNext()
         self.dispatcher().save(self.table().returnRunning())
         self.scheduler().add(self.table().returnRunning())
-        pageOfPCB = self.memoryManager().pageTable().returnRowsOfPID(pcb.getPid())
-        self.dispatcher().load(pcb, pageOfPCB)
+        self.dispatcher().load(pcb)
         self.table().setRunning(pcb)
         self.resetQuantum()
 
@@ -365,17 +610,29 @@ class PageFaultInterruptionHandler(AbstractInterruptionHandler):
         pageVic = victim.page()
         pidVic = victim.pid()
         frame = victim.frame()
-        instructions = self.loader().instructionsForSwapIn\
-            (victim.frame() * self.memoryManager().frameSize(),
+        ###La pagina queda modificada si el MMU escribio en el frame mientras estaba cargada
+        if HARDWARE.mmu.isDirty(frame):
+            victim.setDirty(True)
+        if victim.isDirty():
+            instructions = self.loader().instructionsForSwapIn\
+                (victim.frame() * self.memoryManager().frameSize(),
+                                        self.memoryManager().frameSize())
+            stateOfPcb = self.table().returnPCB(pidVic).getState()
+            ###Se agrega las instrucciones de la pagina al swap
+            self.fileSystem().swapIn(pageVic, pidVic, instructions,
+                                     stateOfPcb)
+            ###Seteo la pagina indicando que esta en memoria swapping
+            self.memoryManager().setRowInSwapping(pidVic, pageVic, True)
+        else:
+            ###Pagina limpia: es igual a la del disco, se descarta y se vuelve a leer del disco
+            self.loader().clearPage(victim.frame() * self.memoryManager().frameSize(),
                                     self.memoryManager().frameSize())
-        stateOfPcb = self.table().returnPCB(pidVic).getState()
-        ###Se agrega las instrucciones de la pagina al swap
-        self.fileSystem().swapIn(pageVic, pidVic, instructions,
-                                 stateOfPcb)
-        ###Seteo la pagina indicando que esta en memoria swapping
-        self.memoryManager().setRowInSwapping(pidVic, pageVic, True)
+            log.logger.info("Clean page discarded: %s", victim)
         ###Seteo el frame de la pagina indicando que es None
         self.memoryManager().setFrameInPage(pidVic, pageVic, None)
+        ###La pagina puede estar en la TLB de cualquier nucleo
+        for core in HARDWARE.cores:
+            core.mmu.invalidate(pidVic, pageVic)
 
         return frame
 
@@ -392,6 +649,39 @@ class PageFaultInterruptionHandler(AbstractInterruptionHandler):
                                          self.memoryManager().frameSize())
         return instructions
 
+    def loadPage(self, pid, page, path, frameId):
+        #busca las instrucciones en Disco o en swapping, de la pagina
+        instructions = self.instructionsForRow(pid, page, path)
+        ###Cargo la pagina en memoria y setea el frame
+        self.memoryManager().setFrameInPage(pid, page, frameId)
+        HARDWARE.mmu.clearDirty(frameId)
+        HARDWARE.mmu.clearReferenced(frameId)
+        self.loader().loadPageInMemory(instructions,
+                            frameId * self.memoryManager().frameSize())
+        ###Agrego la pagina como proxima victima
+        row = self.memoryManager().pageTable().pageOfPid(pid, page)
+        self.memoryManager().addVictim(row)
+        HARDWARE.mmu.setPageFrame(page, frameId)
+
+    ###Fault-around: carga las siguientes faultAround paginas del proceso que no estan en memoria
+    ###(las que ya estan cargadas no cuentan), hasta que se termina el proceso o no hay frames libres
+    ###(no se sacan victimas para esto)
+    def faultAround(self, pid, page, path):
+        loaded = 0
+        nextPage = page + 1
+        while loaded < self.memoryManager().faultAround():
+            row = self.memoryManager().pageTable().pageOfPid(pid, nextPage)
+            if row == None:
+                break
+            if row.frame() == None:
+                frameId = self.memoryManager().allocFrame()
+                if frameId == None:
+                    break
+                self.loadPage(pid, nextPage, path, frameId)
+                self.memoryManager().prefetched(frameId)
+                loaded += 1
+            nextPage += 1
+
     def execute(self, irq):
         ###Pido el pcb que corre actualmente
         pcbInRuning = self.table().returnRunning()
@@ -407,19 +697,11 @@ class PageFaultInterruptionHandler(AbstractInterruptionHandler):
         frameId = self.memoryManager().allocFrame()
         if frameId == None:
             frameId = self.frameOfVictim()
-        #busca las instrucciones en Disco o en swapping, de la pagina
-        instructions = self.instructionsForRow(pid, page, path)
-        ###Cargo la pagina en memoria y setea el frame
-        self.memoryManager().setFrameInPage(pid, page, frameId)
-        self.loader().loadPageInMemory(instructions,
-                            frameId * self.memoryManager().frameSize())
-        ###Agrego la pagina como proxima victima
-        row = self.memoryManager().pageTable().pageOfPid(pid, page)
-        self.memoryManager().addVictim(row)
-        HARDWARE.mmu.setPageFrame(page, frameId)
+        self.loadPage(pid, page, path, frameId)
+        self.faultAround(pid, page, path)
         ### Prints
-        log.logger.info(HARDWARE.memory)
-        log.logger.info("SWAPPING: " + str(self.fileSystem().swapping()))
+        self.logMemory()
+        log.logger.info("SWAPPING: %s", self.fileSystem().swapping())
 
 #Revisado
 class Loader():
@@ -449,32 +731,22 @@ class Loader():
 ###--------------------------------------------------------------------------------------------------------------
 
     def createPage(self, cant,  pid):
-        var = 0
-        page = 0
-        self.memoryManager().pageTable().addRow(pid, page)
-        log.logger.info("Cantidad de instrucciones: "+ str(cant))
-        for index in range(0, cant):
-            if var < self.memoryManager().frameSize()-1 :
-                var = var + 1
-
-            else:
-                page += 1
-                var = 0
-                self.memoryManager().pageTable().addRow(pid, page)
-        log.logger.info("Paginas del pid: " + str(self.memoryManager().pageTable().returnRowsOfPID( pid)))
+        log.logger.info("Cantidad de instrucciones: %s", cant)
+        ##una pagina cada frameSize instrucciones (division redondeando para arriba), al menos una
+        pages = max(1, -(-cant // self.memoryManager().frameSize()))
+        for page in range(0, pages):
+            self.memoryManager().pageTable().addRow(pid, page)
+        if log.infoEnabled():
+            log.logger.info("Paginas del pid: %s", self.memoryManager().pageTable().returnRowsOfPID(pid))
 
     ###Genera las rows de cada proceso
     def load(self, path, pid):
-        cant = len(self.fileSystem().read(path).instructions)
-        #program = self.fileSystem().read(path).instructions
+        cant = self.fileSystem().read(path).getSize()
         self.createPage(cant, pid)
 
     ###Carga las instrucciones en memoria
     def loadPageInMemory(self, instructions, index):
-        for ins in instructions:
-            inst = ins
-            self.getMemory().put(index, inst)
-            index +=1
+        self.getMemory().putPage(index, instructions)
 
     ###Busca las instrucciones en memoria para ser guardadas
     def instructionsForSwapIn(self, index, cant):
@@ -483,132 +755,171 @@ class Loader():
         for i in range(index, cantMax):
             ins =  self.getMemory().get(i)
             res.append(ins)
-            self.getMemory().put(i, '')
+            self.getMemory().put(i, INSTRUCTION_EMPTY)
         return res
 
+    ###Borra una pagina de memoria sin guardarla
+    def clearPage(self, index, cant):
+        self.getMemory().putPage(index, [INSTRUCTION_EMPTY] * cant)
+
 #Revisado
 class Dispatcher():
 
-    def load(self, pcb, pageTableOfPCB):
-        HARDWARE.mmu.resetTLB()
-        for page in pageTableOfPCB :
-            HARDWARE.mmu.setPageFrame(page.page(), page.frame())
+    def __init__(self, pageTable):
+        self._pageTable = pageTable
+        ## tick del timer en el que se cargo el pcb que corre en cada nucleo (coreId -> tick)
+        self._loadedAt = dict()
+
+    def pageTable(self):
+        return self._pageTable
+
+    ###O(1): solo se instala en el MMU la tabla de paginas del proceso
+    ###La TLB no se vacia: sus entradas tienen el pid y se cargan en el primer acceso
+    def load(self, pcb):
+        HARDWARE.mmu.asid = pcb.getPid()
+        HARDWARE.mmu.pageTable = self.pageTable().pageTableOfPID(pcb.getPid())
+        HARDWARE.mmu.limit = pcb.getProgram().getSize() - 1
         value2 = pcb.getPc()
         HARDWARE.cpu.pc = value2
+        self._loadedAt[HARDWARE.core.coreId] = HARDWARE.timer.totalTicks
 
     def save(self, pcb):
+        pcb.addCpuTime(HARDWARE.timer.totalTicks - self._loadedAt.get(HARDWARE.core.coreId, 0))
         pcb.setPc(HARDWARE.cpu.pc)
         pcb.setState("Waiting")
         HARDWARE.cpu.pc = -1
 
 #Revisado
-class Level():
-
-    ##Solo 3 niveles de prioridad
-    def __init__(self):
-        self._list = []
-        for i in range(0, 3):
-            self._list.append([])
-
-    def level(self):
-        return self._list
-
-    ##Agrega un pcb a la queue
-    def addPCB(self, pcb):
-        self.level()[len(self.level()) - 1].append(pcb)
-
-    def elemLevel(self):
-        res = 0
-        for i in self.level():
-            res += len(i)
-        return res
-
-    def returnFirstList(self):
-        return self.level()[0]
-
-    def clearFirstList(self):
-        self.level()[0].clear()
-
-    def addList(self, list):
-        self.level()[len(self.level()) - 1].extend(list)
-
-    def getOlderLevel(self):
-        for i in range(0, len(self.level()) - 1):
-            self.level()[i].extend(self.level()[i + 1])
-            self.level()[i + 1].clear()
-
-    def returnPop(self):
-        for index in self.level():
-            if len(index) > 0:
-                return index.pop(0)
-
-    def __repr__(self):
-        return "(Nivel = {queue})".format(queue=self.level())
-
-#Revisado
+## Cola de listos FIFO sobre una deque
+## remove(pid) es O(1): el pcb se marca como sacado y se descarta cuando llega al frente
 class Scheduler():
 
     def __init__(self):
-        self._queue = []
+        ## entradas (numero, pcb) y numero de la entrada vigente de cada pid
+        self._queue = deque()
+        self._entryOfPid = dict()
+        self._nextEntry = 0
         self._expropiative = False
 
     def readyQueue(self):
-        return self._queue
+        return [pcb for entry, pcb in self._queue if self._entryOfPid.get(pcb.getPid()) == entry]
 
     def returnNext(self):
-        return self.readyQueue().pop(0)
+        while len(self._queue) > 0:
+            entry, pcb = self._queue.popleft()
+            if self._entryOfPid.get(pcb.getPid()) == entry:
+                del self._entryOfPid[pcb.getPid()]
+                return pcb
+        return None
 
     def isExpropiation(self):
         return self._expropiative
 
+    ##En un scheduler expropiativo: el pcb que llega desaloja al que esta corriendo
+    def hasPriorityOver(self, pcb, running):
+        return pcb.getPriority() < running.getPriority()
+
     def add(self, pcb):
-        self.readyQueue().append(pcb)
+        self._queue.append((self._nextEntry, pcb))
+        self._entryOfPid[pcb.getPid()] = self._nextEntry
+        self._nextEntry += 1
+
+    ##Saca de la cola al pcb (ej. un proceso que se mato), retorna si estaba
+    def remove(self, pid):
+        return self._entryOfPid.pop(pid, None) != None
 
     def noIsEmpty(self):
-        return len(self.readyQueue()) > 0
+        return len(self._entryOfPid) > 0
 
     def __repr__(self):
         return "(ReadyQueue = {queue})".format(queue=self.readyQueue())
 
+## Cola de listos por prioridad con envejecimiento
+## cada nivel es una deque de tandas [epoca, deque de pcbs]: los pcbs que entraron al nivel en la
+## misma epoca (cantidad de returnNext hechos). Cada AGING_PERIOD epocas la tanda mas vieja de los
+## niveles >= 2 sube entera un nivel, sin mover los pcbs de a uno.
+## Un bitmap de niveles no vacios da el de mayor prioridad en O(1).
 class SchedulerPriority(Scheduler):
 
+    AGING_PERIOD = 3
+
     def __init__(self, levels, isExpropiation):
         super(SchedulerPriority, self).__init__()
         self._expropiative = isExpropiation
+        self._levels = []
         for i in range(0, levels):
-            self._queue.append(Level())
+            self._levels.append(deque())
+        self._countOfLevel = [0] * levels
+        self._count = 0
+        self._nonEmptyLevels = 0
+        self._epoch = 0
 
-    def getOlder(self):
-        for index in range(1, len(self.readyQueue())):
-            self.readyQueue()[index].getOlderLevel()
-            if index < len(self.readyQueue()) - 1:
-                self.readyQueue()[index].addList(self.readyQueue()[index + 1].returnFirstList())
-                self.readyQueue()[index + 1].clearFirstList()
+    def readyQueue(self):
+        return [[pcb for batch in level for pcb in batch[1]] for level in self._levels]
 
     def add(self, pcb):
-        self.readyQueue()[pcb.getPriority()].addPCB(pcb)
+        self.addToLevel(pcb.getPriority(), deque([pcb]))
+
+    ##Los pcbs que entran en la epoca actual van a la misma tanda
+    def addToLevel(self, level, pcbs):
+        queue = self._levels[level]
+        if len(queue) > 0 and queue[-1][0] == self._epoch:
+            queue[-1][1].extend(pcbs)
+        else:
+            queue.append([self._epoch, pcbs])
+        self._countOfLevel[level] += len(pcbs)
+        self._count += len(pcbs)
+        self._nonEmptyLevels |= 1 << level
+
+    def removeFromLevel(self, level, cant):
+        self._countOfLevel[level] -= cant
+        self._count -= cant
+        if self._countOfLevel[level] == 0:
+            self._nonEmptyLevels &= ~(1 << level)
+
+    def getOlder(self):
+        self._epoch += 1
+        for level in range(2, len(self._levels)):
+            queue = self._levels[level]
+            if len(queue) > 0 and queue[0][0] == self._epoch - self.AGING_PERIOD:
+                pcbs = queue.popleft()[1]
+                self.removeFromLevel(level, len(pcbs))
+                self.addToLevel(level - 1, pcbs)
 
     def noIsEmpty(self):
-        var = 0
-        for index in self.readyQueue():
-            var += index.elemLevel()
-        return var > 0
+        return self._count > 0
+
+    def remove(self, pid):
+        for level in range(0, len(self._levels)):
+            for batch in self._levels[level]:
+                for pcb in batch[1]:
+                    if pcb.getPid() == pid:
+                        batch[1].remove(pcb)
+                        if len(batch[1]) == 0:
+                            self._levels[level].remove(batch)
+                        self.removeFromLevel(level, 1)
+                        return True
+        return False
 
     def returnNext(self):
-        for index in self.readyQueue():
-            if index.elemLevel() > 0:
-                pcbReturn = index.returnPop()
-                self.getOlder()
-                return pcbReturn
+        if self._count == 0:
+            return None
+        ##el bit mas bajo prendido es el nivel de mayor prioridad
+        level = (self._nonEmptyLevels & -self._nonEmptyLevels).bit_length() - 1
+        queue = self._levels[level]
+        pcbs = queue[0][1]
+        pcbReturn = pcbs.popleft()
+        if len(pcbs) == 0:
+            queue.popleft()
+        self.removeFromLevel(level, 1)
+        self.getOlder()
+        return pcbReturn
 
 class SchedulerRRPriority(SchedulerPriority):
 
     def __init__(self, levels, isExpropiation, quantum):
-        super(SchedulerPriority, self).__init__()
-        self._expropiative = isExpropiation
+        super(SchedulerRRPriority, self).__init__(levels, isExpropiation)
         HARDWARE.timer.quantum = quantum
-        for i in range(0, levels):
-            self._queue.append(Level())
 
 class SchedulerRR(Scheduler):
 
@@ -616,13 +927,171 @@ class SchedulerRR(Scheduler):
         super(SchedulerRR, self).__init__()
         HARDWARE.timer.quantum = quantum
 
+## Cola de listos ordenada por una clave: heap de (clave, entrada, pcb)
+## la clave se calcula al encolar, la entrada desempata por orden de llegada
+class SchedulerHeap(Scheduler):
+
+    def __init__(self):
+        super(SchedulerHeap, self).__init__()
+        self._queue = []
+
+    def keyOf(self, pcb):
+        log.logger.error("-- KEYOF MUST BE OVERRIDEN in class {classname}".format(classname=self.__class__.__name__))
+
+    def readyQueue(self):
+        return [pcb for key, entry, pcb in sorted(self._queue) if self._entryOfPid.get(pcb.getPid()) == entry]
+
+    def add(self, pcb):
+        heappush(self._queue, (self.keyOf(pcb), self._nextEntry, pcb))
+        self._entryOfPid[pcb.getPid()] = self._nextEntry
+        self._nextEntry += 1
+
+    def returnNext(self):
+        while len(self._queue) > 0:
+            key, entry, pcb = heappop(self._queue)
+            if self._entryOfPid.get(pcb.getPid()) == entry:
+                del self._entryOfPid[pcb.getPid()]
+                return pcb
+        return None
+
+## Shortest Job First: el proximo es el de menor rafaga de CPU hasta su proxima IO
+## la rafaga se calcula del programa con el pc guardado al encolar
+class SchedulerSJF(SchedulerHeap):
+
+    def keyOf(self, pcb):
+        return pcb.remainingBurst()
+
+## Shortest Remaining Time First: SJF expropiativo
+## el que llega desaloja al que corre si su rafaga es menor a lo que le queda al que corre
+class SchedulerSRTF(SchedulerSJF):
+
+    def __init__(self):
+        super(SchedulerSRTF, self).__init__()
+        self._expropiative = True
+
+    def hasPriorityOver(self, pcb, running):
+        return pcb.remainingBurst() < running.remainingBurst(HARDWARE.cpu.pc)
+
+## Completely Fair Scheduler: el proximo es el de menor runtime virtual (ticks en cpu pesados por prioridad)
+## El quantum se recalcula en cada returnNext: la latencia objetivo se reparte entre los procesos
+## listos segun su peso, sin bajar de minGranularity ticks.
+class SchedulerCFS(SchedulerHeap):
+
+    def __init__(self, targetLatency = 12, minGranularity = 2):
+        super(SchedulerCFS, self).__init__()
+        self._targetLatency = targetLatency
+        self._minGranularity = minGranularity
+        ## runtime virtual minimo de la cola, no decrece
+        self._minVruntime = 0
+        self._pcbOfPid = dict()
+        self._weight = 0
+        HARDWARE.timer.quantum = targetLatency
+
+    def keyOf(self, pcb):
+        return pcb.getVruntime()
+
+    ##Los nuevos y los que vuelven de IO se ubican cerca del minimo para que no acaparen el cpu
+    def add(self, pcb):
+        pcb.setVruntime(max(pcb.getVruntime(), self._minVruntime - self._targetLatency / 2))
+        super(SchedulerCFS, self).add(pcb)
+        self._pcbOfPid[pcb.getPid()] = pcb
+        self._weight += pcb.weight()
+
+    def remove(self, pid):
+        pcb = self._pcbOfPid.pop(pid, None)
+        if pcb != None:
+            self._weight -= pcb.weight()
+        return super(SchedulerCFS, self).remove(pid)
+
+    def returnNext(self):
+        pcb = super(SchedulerCFS, self).returnNext()
+        if pcb != None:
+            del self._pcbOfPid[pcb.getPid()]
+            self._minVruntime = max(self._minVruntime, pcb.getVruntime())
+            HARDWARE.timer.quantum = self.timeSlice(pcb, len(self._pcbOfPid) + 1, self._weight)
+            HARDWARE.timer.reset()
+            self._weight -= pcb.weight()
+        return pcb
+
+    ##Quantum del pcb: su parte de la latencia objetivo (que crece si hay muchos listos)
+    def timeSlice(self, pcb, runnable, weight):
+        period = max(self._targetLatency, runnable * self._minGranularity)
+        return max(self._minGranularity, period * pcb.weight() // weight)
+
+## Una cola de listos por nucleo, cada una con su propio scheduler (newScheduler() crea uno)
+## Los pcbs se encolan en la cola del nucleo actual. Si un nucleo tiene la cola vacia le roba
+## el proximo a la cola mas cargada (work stealing), asi no queda ocioso mientras haya listos.
+class SchedulerMultiCore(Scheduler):
+
+    def __init__(self, newScheduler = Scheduler):
+        super(SchedulerMultiCore, self).__init__()
+        self._queues = []
+        ##Cada scheduler se crea con su nucleo como actual (ej. SchedulerRR configura el timer del nucleo)
+        current = HARDWARE.core.coreId
+        for core in HARDWARE.cores:
+            HARDWARE.selectCore(core.coreId)
+            self._queues.append(newScheduler())
+        HARDWARE.selectCore(current)
+        self._countOfCore = [0] * len(self._queues)
+        self._count = 0
+        self._steals = 0
+
+    def queueOfCore(self, coreId):
+        return self._queues[coreId]
+
+    def steals(self):
+        return self._steals
+
+    def readyQueue(self):
+        return [queue.readyQueue() for queue in self._queues]
+
+    def isExpropiation(self):
+        return self._queues[HARDWARE.core.coreId].isExpropiation()
+
+    def hasPriorityOver(self, pcb, running):
+        return self._queues[HARDWARE.core.coreId].hasPriorityOver(pcb, running)
+
+    def add(self, pcb):
+        coreId = HARDWARE.core.coreId
+        self._queues[coreId].add(pcb)
+        self._countOfCore[coreId] += 1
+        self._count += 1
+
+    def returnNext(self):
+        if self._count == 0:
+            return None
+        coreId = HARDWARE.core.coreId
+        if self._countOfCore[coreId] == 0:
+            ##Se roba de la cola con mas pcbs
+            victim = max(range(0, len(self._queues)), key=lambda other: self._countOfCore[other])
+            log.logger.info("Core %s steals from core %s", coreId, victim)
+            self._steals += 1
+            coreId = victim
+        self._countOfCore[coreId] -= 1
+        self._count -= 1
+        return self._queues[coreId].returnNext()
+
+    def remove(self, pid):
+        for coreId in range(0, len(self._queues)):
+            if self._queues[coreId].remove(pid):
+                self._countOfCore[coreId] -= 1
+                self._count -= 1
+                return True
+        return False
+
+    def noIsEmpty(self):
+        return self._count > 0
+
 class Row():
     def __init__(self, pid, page):
         self._pid = pid
         self._page = page
         self._frame = None
         self._loadedInSwapping = False
-        self._isSecondOpportunity = False
+        ## la pagina fue modificada (difiere de la del disco)
+        self._dirty = False
+        ## nodo en el reloj de SecondChance (None si no esta en memoria)
+        self._victimHandle = None
 
     def pid(self):
         return self._pid
@@ -630,11 +1099,11 @@ class Row():
     def page(self):
         return self._page
 
-    def isSecondOpportunity(self):
-        return self._isSecondOpportunity
+    def victimHandle(self):
+        return self._victimHandle
 
-    def setSecondOpportunity(self):
-         self._isSecondOpportunity = True
+    def setVictimHandle(self, handle):
+        self._victimHandle = handle
 
     def frame(self):
         return self._frame
@@ -642,6 +1111,9 @@ class Row():
 
     def isLoadedInSwapping(self):
         return self._loadedInSwapping
+
+    def isDirty(self):
+        return self._dirty
 ###------------------------------------------------------------------------------------------------------------------
 
     def setFrame(self, frame):
@@ -650,29 +1122,43 @@ class Row():
     def setLoadInSwapping(self, bool):
         self._loadedInSwapping = bool
 
+    def setDirty(self, bool):
+        self._dirty = bool
+
     def __repr__(self):
         return "(" + "PDI={pdi}".format(pdi=self._pid) + " PAGE={page}".format(page=self._page) + " FRAME={frame}".format(
             frame=self._frame)+ " ISLOADEDINSWAPPING ={loaded}".format(loaded=self._loadedInSwapping) + \
-               " ISSECONDCHANCE ={chance}".format(chance=self._isSecondOpportunity)+ ")"
+               " DIRTY={dirty}".format(dirty=self._dirty) + ")"
 
 #Revisado
 class TablePage():
 
     def __init__(self):
-        self._queuePage = []
+        ## pid -> {page -> Row}, las paginas de cada pid quedan en orden
+        self._rowsOfPid = dict()
 
     def queuePage(self):
-        return self._queuePage
+        res = []
+        for rows in self._rowsOfPid.values():
+            res.extend(rows.values())
+        return res
 
     def addRow(self, pid, page):
-        self._queuePage.append(Row( pid, page))
+        self.pageTableOfPID(pid)[page] = Row(pid, page)
+
+    ###Tabla de paginas del proceso: {page -> Row}
+    def pageTableOfPID(self, pid):
+        rows = self._rowsOfPid.get(pid)
+        if rows == None:
+            rows = dict()
+            self._rowsOfPid[pid] = rows
+        return rows
 
     def returnRowsOfPID(self, pid):
-        res = []
-        for row in self.queuePage():
-            if row.pid() == pid:
-                res.append(row)
-        return res
+        rows = self._rowsOfPid.get(pid)
+        if rows == None:
+            return []
+        return list(rows.values())
 
     def setFrameOfPage(self, pid, page, frame):
         row = self.pageOfPid(pid, page)
@@ -684,15 +1170,38 @@ class TablePage():
 
     ###Retorna la pagina deseada pertenciente a un pid
     def pageOfPid(self, pid, page):
-        rows = self.returnRowsOfPID(pid)
-        for row in rows:
-            if row.page() == page:
-                return row
+        rows = self._rowsOfPid.get(pid)
+        if rows == None:
+            return None
+        return rows.get(page)
 
     def __repr__(self):
-        return "(" + "TABLEPAGE ={table}".format(table=self._queuePage) + ")"
+        return "(" + "TABLEPAGE ={table}".format(table=self.queuePage()) + ")"
+
+## Politica de reemplazo de paginas
+## addVictim: se cargo la pagina en un frame, removeVictim: se libero el frame,
+## returnVictim: elige la proxima victima y la saca, accessed: el MMU accedio al frame
+class AbstractReplacementPolicy():
+
+    def addVictim(self, victim):
+        log.logger.error("-- addVictim MUST BE OVERRIDEN in class {classname}".format(classname=self.__class__.__name__))
+
+    def removeVictim(self, victim):
+        log.logger.error("-- removeVictim MUST BE OVERRIDEN in class {classname}".format(classname=self.__class__.__name__))
+
+    def returnVictim(self):
+        log.logger.error("-- returnVictim MUST BE OVERRIDEN in class {classname}".format(classname=self.__class__.__name__))
 
-class VictimFIFO():
+    def listVictim(self):
+        log.logger.error("-- listVictim MUST BE OVERRIDEN in class {classname}".format(classname=self.__class__.__name__))
+
+    def accessed(self, frameId):
+        pass
+
+    def __repr__(self):
+        return "(" + "LIST VICTIM={list}".format(list=self.listVictim())  + ")"
+
+class VictimFIFO(AbstractReplacementPolicy):
     def __init__(self):
         self._listVictim = []
 
@@ -713,61 +1222,266 @@ class VictimFIFO():
         return "(" + "LIST VICTIM={list}".format(list=self._listVictim)  + ")"
 
 
-class SecondChance():
+## nodo del reloj de SecondChance, cada Row cargada en memoria guarda el suyo
+class ClockNode():
+    __slots__ = ('row', 'next', 'prev')
+
+    def __init__(self, row):
+        self.row = row
+        self.next = self
+        self.prev = self
+
+## Second Chance como reloj: lista circular doblemente enlazada con una aguja
+## usa el bit de referencia que el MMU prende en cada acceso al frame
+class SecondChance(AbstractReplacementPolicy):
 
     def __init__(self):
-        self._listVictim = []
-        self._index = 0
+        self._hand = None
+        self._size = 0
+
+    def hand(self):
+        return self._hand
+
+    def listVictim(self):
+        res = []
+        node = self._hand
+        for i in range(0, self._size):
+            res.append(node.row)
+            node = node.next
+        return res
+
+    ###La nueva victima queda justo antes de la aguja (es la ultima que se revisa)
+    def addVictim(self, victim):
+        node = ClockNode(victim)
+        if self._hand == None:
+            self._hand = node
+        else:
+            node.next = self._hand
+            node.prev = self._hand.prev
+            self._hand.prev.next = node
+            self._hand.prev = node
+        victim.setVictimHandle(node)
+        self._size += 1
 
+    def removeVictim(self, victim):
+        node = victim.victimHandle()
+        if node == None:
+            return
+        if self._size == 1:
+            self._hand = None
+        else:
+            node.prev.next = node.next
+            node.next.prev = node.prev
+            if self._hand is node:
+                self._hand = node.next
+        victim.setVictimHandle(None)
+        self._size -= 1
+
+    ###Avanza la aguja apagando los bits de referencia hasta encontrar un frame no referenciado
+    def returnVictim(self):
+        while HARDWARE.mmu.isReferenced(self._hand.row.frame()):
+            HARDWARE.mmu.clearReferenced(self._hand.row.frame())
+            self._hand = self._hand.next
+        victim = self._hand.row
+        self.removeVictim(victim)
+        return victim
 
-    def index(self):
-        return self._index
+## LRU exacto: frames ordenados del menos al mas recientemente usado
+## el MMU avisa cada acceso y el frame pasa al final
+class LRU(AbstractReplacementPolicy):
 
+    def __init__(self):
+        self._rows = OrderedDict()
 
     def addVictim(self, victim):
-        self._listVictim.append(victim)
+        self._rows[victim.frame()] = victim
+
+    def removeVictim(self, victim):
+        self._rows.pop(victim.frame(), None)
+
+    def accessed(self, frameId):
+        if frameId in self._rows:
+            self._rows.move_to_end(frameId)
+
+    def returnVictim(self):
+        return self._rows.popitem(last=False)[1]
 
     def listVictim(self):
-        return self._listVictim
+        return list(self._rows.values())
+
+## Aging (NFU con envejecimiento): cada frame tiene un contador de bits
+## cada period ticks del clock los contadores se desplazan y entra el bit de referencia del MMU
+## la victima es la de menor contador
+class Aging(AbstractReplacementPolicy):
+
+    def __init__(self, bits = 8, period = 4):
+        self._rows = dict()
+        self._counters = dict()
+        self._bits = bits
+        self._topBit = 1 << (bits - 1)
+        self._period = period
+        self._tickCount = 0
+        HARDWARE.clock.addSubscriber(self)
+
+    ##Subscriber del clock: envejece cada period ticks
+    def tick(self, tickNbr):
+        self._tickCount += 1
+        if self._tickCount >= self._period:
+            self._tickCount = 0
+            self.age()
+
+    ##El envejecimiento no levanta interrupciones: no es un evento para el fastForward
+    ##(asi el clock ocioso no gira en vacio y los saltos no se cortan cada period ticks)
+    def ticksToNextEvent(self):
+        return None
+
+    ##los envejecimientos de los ticks salteados se aplican todos juntos
+    def skip(self, ticks):
+        self._tickCount += ticks
+        shifts = self._tickCount // self._period
+        self._tickCount = self._tickCount % self._period
+        if shifts > 0:
+            self.age(shifts)
 
-    def removeVictim(self, victim):
-        self.listVictim().remove(victim)
-        if self.index() > len(self.listVictim()):
-            self._index -=1
+    def addVictim(self, victim):
+        self._rows[victim.frame()] = victim
+        self._counters[victim.frame()] = 0
 
+    def removeVictim(self, victim):
+        self._rows.pop(victim.frame(), None)
+        self._counters.pop(victim.frame(), None)
+
+    ##una pagina referenciada en el salto se toma como referenciada en cada periodo
+    ##(una rafaga salteada corre sobre la misma pagina todo el salto)
+    def age(self, shifts = 1):
+        shifts = min(shifts, self._bits)
+        for frame in self._counters:
+            referenced = HARDWARE.mmu.isReferenced(frame)
+            counter = self._counters[frame]
+            for shift in range(0, shifts):
+                counter >>= 1
+                if referenced:
+                    counter |= self._topBit
+            self._counters[frame] = counter
+            if referenced:
+                HARDWARE.mmu.clearReferenced(frame)
 
     def returnVictim(self):
-        long = len(self._listVictim)
-        while not self._listVictim[self.index()].isSecondOpportunity():
-            self.listVictim()[self._index].setSecondOpportunity()
-            if self.index() < long -1:
-                self._index += 1
-            else:
-                self._index = 0
+        frame = min(self._counters, key=self._counters.get)
+        del self._counters[frame]
+        return self._rows.pop(frame)
+
+    def listVictim(self):
+        return list(self._rows.values())
 
+## WSClock: reloj que ademas guarda el tiempo virtual (accesos del MMU) del ultimo uso de cada frame
+## la victima es la primera pagina no referenciada fuera del working set (ultimo uso hace mas de tau)
+## si todas estan en el working set se saca la de uso mas viejo
+class WSClock(SecondChance):
 
-        victim = self._listVictim[self._index]
-        self.listVictim().remove(self._listVictim[self._index])
-        if self.index() < long -1:
-            self._index += 1
+    def __init__(self, tau):
+        super(WSClock, self).__init__()
+        self._tau = tau
+        self._lastUse = dict()
+
+    def addVictim(self, victim):
+        super(WSClock, self).addVictim(victim)
+        self._lastUse[victim.frame()] = HARDWARE.mmu.accessCount()
+
+    def removeVictim(self, victim):
+        super(WSClock, self).removeVictim(victim)
+        self._lastUse.pop(victim.frame(), None)
+
+    def returnVictim(self):
+        now = HARDWARE.mmu.accessCount()
+        oldest = self._hand
+        for i in range(0, self._size):
+            frame = self._hand.row.frame()
+            if HARDWARE.mmu.isReferenced(frame):
+                HARDWARE.mmu.clearReferenced(frame)
+                self._lastUse[frame] = now
+            elif now - self._lastUse[frame] > self._tau:
+                break
+            if self._lastUse[frame] < self._lastUse[oldest.row.frame()]:
+                oldest = self._hand
+            self._hand = self._hand.next
         else:
-            self._index = 0
+            self._hand = oldest
+        victim = self._hand.row
+        self.removeVictim(victim)
         return victim
 
+## Frames libres: cola para alloc/free en O(1) y bitmap para saber si un frame esta libre
+class FrameAllocator():
+
+    def __init__(self, frames):
+        self._queue = deque(range(0, frames))
+        self._isFree = bytearray(b'\x01') * frames
+        ## si el frame tiene una entrada en la cola: cada frame esta a lo sumo una vez (len(cola) <= frames)
+        self._inQueue = bytearray(b'\x01') * frames
+        self._freeCount = frames
+
+    def freeCount(self):
+        return self._freeCount
+
+    def isFree(self, frame):
+        return self._isFree[frame] == 1
+
+    def frames(self):
+        return [frame for frame, free in enumerate(self._isFree) if free]
+
+    def alloc(self):
+        while len(self._queue) > 0:
+            frame = self._queue.popleft()
+            self._inQueue[frame] = 0
+            ## en la cola pueden quedar frames que ya se entregaron con allocContiguous
+            if self._isFree[frame]:
+                self._isFree[frame] = 0
+                self._freeCount -= 1
+                return frame
+        return None
+
+    ## libera el frame, si ya estaba libre no hace nada
+    def free(self, frame):
+        if not self._isFree[frame]:
+            self._isFree[frame] = 1
+            self._freeCount += 1
+            ## si quedo en la cola desde un allocContiguous no se vuelve a encolar
+            if not self._inQueue[frame]:
+                self._inQueue[frame] = 1
+                self._queue.append(frame)
+
+    ## reserva cant frames consecutivos, retorna la lista de frames (None si no hay)
+    def allocContiguous(self, cant):
+        if cant > self._freeCount:
+            return None
+        start = self._isFree.find(b'\x01' * cant)
+        if start == -1:
+            return None
+        self._isFree[start:start + cant] = bytes(cant)
+        self._freeCount -= cant
+        return list(range(start, start + cant))
+
     def __repr__(self):
-        return "(" + "LIST VICTIM={list}".format(list=self._listVictim)  + ")"
+        return "(" + "FRAMES={frames}".format(frames=self.frames()) + ")"
 
 class MemoryManager():
 
-    def __init__(self, memory, frameSize, tablePage):
+    ##replacementPolicy: VictimFIFO, SecondChance (por defecto), LRU, Aging o WSClock
+    ##faultAround: cantidad de paginas siguientes a cargar en cada PAGEFAULT
+    def __init__(self, memory, frameSize, tablePage, replacementPolicy = None, faultAround = 0):
         self._memory = memory
         self._pageTable = tablePage
         self._frameSize = frameSize
-        self._listVictim = SecondChance()
-        #self._listVictim = VictimFIFO()
-        self._freeFrames = []
-        for index in range(0, (memory.getSize() // frameSize)):
-           self._freeFrames.append(index)
+        self._listVictim = replacementPolicy
+        if replacementPolicy == None:
+            self._listVictim = SecondChance()
+        self._freeFrames = FrameAllocator(memory.getSize() // frameSize)
+        self._faultAround = faultAround
+        ## frames cargados por fault-around que todavia no se usaron
+        self._prefetchedFrames = set()
+        self._prefetchedPages = 0
+        self._faultsAvoided = 0
 
     def getMemory(self):
         return self._memory
@@ -784,16 +1498,40 @@ class MemoryManager():
     def freeFrames(self):
         return self._freeFrames
 
+    def faultAround(self):
+        return self._faultAround
+
+    def prefetchedPages(self):
+        return self._prefetchedPages
+
+    ###Paginas cargadas por fault-around que se usaron antes de salir de memoria
+    def faultsAvoided(self):
+        return self._faultsAvoided
+
 ###-----------------------------------------------------------------------------------------------------------------
 
     def addFrames(self, listFrames):
         for frame in listFrames:
-            if self.freeFrames().count(frame) < 1:
-                self.freeFrames().append(frame)
+            self._prefetchedFrames.discard(frame)
+            self.freeFrames().free(frame)
+
+    ###Se cargo una pagina por fault-around en el frame
+    def prefetched(self, frame):
+        self._prefetchedPages += 1
+        self._prefetchedFrames.add(frame)
+
+    ###Aviso del MMU: el primer acceso a una pagina precargada es una falla de pagina evitada
+    def accessed(self, frameId):
+        if frameId in self._prefetchedFrames:
+            self._prefetchedFrames.remove(frameId)
+            self._faultsAvoided += 1
 
     def allocFrame(self):
-        if len(self.freeFrames()) > 0:
-            return self.freeFrames().pop(0)
+        return self.freeFrames().alloc()
+
+    ###Reserva cant frames consecutivos (None si no hay)
+    def allocFrames(self, cant):
+        return self.freeFrames().allocContiguous(cant)
 
      ###Agrega una victima a la lista de victimas
     def addVictim(self, row):
@@ -801,8 +1539,10 @@ class MemoryManager():
 
     ##Retorna la siguiente victima
     def nextVictim(self):
-        log.logger.info("Table Page: " + str(self.pageTable()))
-        return self.listVictim().returnVictim()
+        log.logger.info("Table Page: %s", self.pageTable())
+        victim = self.listVictim().returnVictim()
+        self._prefetchedFrames.discard(victim.frame())
+        return victim
 
     def setFrameInPage(self, pid , page, frame):
         self.pageTable().setFrameOfPage(pid , page, frame)
@@ -812,9 +1552,12 @@ class MemoryManager():
 
 class FileSystem():
 
-    def __init__(self):
+    ##swapping: Swapping en memoria por defecto, o un FileSwapping
+    def __init__(self, swapping = None):
         self._disk = Disk()
-        self._swapping = Swapping()
+        self._swapping = swapping
+        if swapping == None:
+            self._swapping = Swapping()
 
     def disk(self):
         return self._disk
@@ -843,16 +1586,35 @@ class FileSystem():
 
 class Kernel():
 
-    def __init__(self):
-        HARDWARE.mmu.frameSize = 4
-        ## controls the Hardware's I/O Device
-        self._ioDeviceController = IoDeviceController(HARDWARE.ioDevice)
+    ##swapping: opcional, ej. FileSwapping("swap.bin", 4, 1024) para swapear a un archivo
+    ##replacementPolicy: opcional, ej. LRU() (por defecto SecondChance)
+    ##faultAround: cantidad de paginas siguientes que se cargan en cada PAGEFAULT si hay frames libres
+    ##scheduler: opcional, ej. SchedulerSRTF() (por defecto Scheduler FIFO, con varios nucleos
+    ##SchedulerMultiCore() con una cola FIFO por nucleo)
+    ##ioQueues: opcional, deviceId -> cola de espera, ej. {"SeekDisk": IoQueueSCAN()} (por defecto IoQueueFIFO)
+    def __init__(self, swapping = None, replacementPolicy = None, faultAround = 0, scheduler = None, ioQueues = None):
+        for core in HARDWARE.cores:
+            core.mmu.frameSize = 4
+        ## controls the Hardware's I/O Devices: un controller por device (deviceId -> controller)
+        self._ioDeviceControllers = OrderedDict()
+        for ioDevice in HARDWARE.ioDevices:
+            queue = None
+            if ioQueues != None:
+                queue = ioQueues.get(ioDevice.deviceId)
+            self._ioDeviceControllers[ioDevice.deviceId] = IoDeviceController(ioDevice, queue)
         self._tablePCB = PcbTable()
-        self._fileSystem = FileSystem()
-        self._memoryManager = MemoryManager(HARDWARE.memory,4,TablePage())
+        self._fileSystem = FileSystem(swapping)
+        self._memoryManager = MemoryManager(HARDWARE.memory,4,TablePage(), replacementPolicy, faultAround)
+        HARDWARE.mmu.addAccessObserver(self._memoryManager.listVictim())
+        if faultAround > 0:
+            HARDWARE.mmu.addAccessObserver(self._memoryManager)
         self._loader = Loader(self._memoryManager, self._fileSystem, HARDWARE.memory)
-        self._dispatcher = Dispatcher()
-        self._scheduler = Scheduler()
+        self._dispatcher = Dispatcher(self._memoryManager.pageTable())
+        self._scheduler = scheduler
+        if scheduler == None and len(HARDWARE.cores) > 1:
+            self._scheduler = SchedulerMultiCore()
+        elif scheduler == None:
+            self._scheduler = Scheduler()
 
 
         ## setup interruption handlers
@@ -867,19 +1629,23 @@ class Kernel():
         HARDWARE.interruptVector.register(NEW_INTERRUPTION_TYPE, newHandler)
 
         ioInHandler = IoInInterruptionHandler(self._tablePCB, self._scheduler, self._dispatcher,
-                                              self._ioDeviceController,self._memoryManager, self._fileSystem)
+                                              self._ioDeviceControllers,self._memoryManager, self._fileSystem)
         HARDWARE.interruptVector.register(IO_IN_INTERRUPTION_TYPE, ioInHandler)
 
         ioOutHandler = IoOutInterruptionHandler(self._tablePCB, self._scheduler, self._dispatcher,
-                                                self._ioDeviceController,self._memoryManager, self._fileSystem)
+                                                self._ioDeviceControllers,self._memoryManager, self._fileSystem)
         HARDWARE.interruptVector.register(IO_OUT_INTERRUPTION_TYPE, ioOutHandler)
 
         timeoutHandler = TimeOutInterruptionHandler(self._tablePCB, self._scheduler, self._dispatcher,self._memoryManager, self._fileSystem)
         HARDWARE.interruptVector.register(TIMEOUT_INTERRUPTION_TYPE, timeoutHandler)
 
+    ## controller del device 0 (Printer)
     @property
     def ioDeviceController(self):
-        return self._ioDeviceController
+        return self._ioDeviceControllers[HARDWARE.ioDevice.deviceId]
+
+    def ioDeviceControllers(self):
+        return self._ioDeviceControllers
 
     def table(self):
         return self._tablePCB
@@ -899,6 +1665,20 @@ class Kernel():
     def setScheduler(self, _scheduler):
         self._planificador = _scheduler
 
+    ##No queda nada por ejecutar
+    def isIdle(self):
+        for core in HARDWARE.cores:
+            if core.cpu.isBusy():
+                return False
+        for controller in self._ioDeviceControllers.values():
+            if controller.hasWaiting():
+                return False
+        return not self.scheduler().noIsEmpty() and not self.table().hasActivePCB()
+
+    ##Corre el clock hasta que termina todo, retorna (ticks, tiempo real)
+    def runUntilIdle(self):
+        return HARDWARE.clock.run_until_idle(self.isIdle)
+
     def run(self, path, priority=0):
         newIRQ = IRQ(NEW_INTERRUPTION_TYPE, [path, priority])
         HARDWARE.interruptVector.handle(newIRQ)
@@ -0,0 +1,55 @@
+from collections import deque
+
+## Frames libres: cola para alloc/free en O(1) y bitmap para saber si un frame esta libre
+class FrameAllocator():
+
+    def __init__(self, frames):
+        self._queue = deque(range(0, frames))
+        self._isFree = bytearray(b'\x01') * frames
+        ## si el frame tiene una entrada en la cola: cada frame esta a lo sumo una vez (len(cola) <= frames)
+        self._inQueue = bytearray(b'\x01') * frames
+        self._freeCount = frames
+
+    def freeCount(self):
+        return self._freeCount
+
+    def isFree(self, frame):
+        return self._isFree[frame] == 1
+
+    def frames(self):
+        return [frame for frame, free in enumerate(self._isFree) if free]
+
+    def alloc(self):
+        while len(self._queue) > 0:
+            frame = self._queue.popleft()
+            self._inQueue[frame] = 0
+            ## en la cola pueden quedar frames que ya se entregaron con allocContiguous
+            if self._isFree[frame]:
+                self._isFree[frame] = 0
+                self._freeCount -= 1
+                return frame
+        return None
+
+    ## libera el frame, si ya estaba libre no hace nada
+    def free(self, frame):
+        if not self._isFree[frame]:
+            self._isFree[frame] = 1
+            self._freeCount += 1
+            ## si quedo en la cola desde un allocContiguous no se vuelve a encolar
+            if not self._inQueue[frame]:
+                self._inQueue[frame] = 1
+                self._queue.append(frame)
+
+    ## reserva cant frames consecutivos, retorna la lista de frames (None si no hay)
+    def allocContiguous(self, cant):
+        if cant > self._freeCount:
+            return None
+        start = self._isFree.find(b'\x01' * cant)
+        if start == -1:
+            return None
+        self._isFree[start:start + cant] = bytes(cant)
+        self._freeCount -= cant
+        return list(range(start, start + cant))
+
+    def __repr__(self):
+        return "(" + "FRAMES={frames}".format(frames=self.frames()) + ")"
@@ -1,15 +1,16 @@
 from so.SecondChance import *
+from so.FrameAllocator import *
 class MemoryManager():
 
-    def __init__(self, memory, frameSize, tablePage):
+    ##replacementPolicy: politica de reemplazo (por defecto SecondChance)
+    def __init__(self, memory, frameSize, tablePage, replacementPolicy = None):
         self._memory = memory
         self._pageTable = tablePage
         self._frameSize = frameSize
-        self._listVictim = SecondChance()
-        #self._listVictim = VictimFIFO()
-        self._freeFrames = []
-        for index in range(0, (memory.getSize() // frameSize)):
-           self._freeFrames.append(index)
+        self._listVictim = replacementPolicy
+        if replacementPolicy == None:
+            self._listVictim = SecondChance()
+        self._freeFrames = FrameAllocator(memory.getSize() // frameSize)
 
     def getMemory(self):
         return self._memory
@@ -30,12 +31,14 @@ class MemoryManager():
 
     def addFrames(self, listFrames):
         for frame in listFrames:
-            if self.freeFrames().count(frame) < 1:
-                self.freeFrames().append(frame)
+            self.freeFrames().free(frame)
 
     def allocFrame(self):
-        if len(self.freeFrames()) > 0:
-            return self.freeFrames().pop(0)
+        return self.freeFrames().alloc()
+
+    ###Reserva cant frames consecutivos (None si no hay)
+    def allocFrames(self, cant):
+        return self.freeFrames().allocContiguous(cant)
 
      ###Agrega una victima a la lista de victimas
     def addVictim(self, row):
@@ -43,7 +46,7 @@ class MemoryManager():
 
     ##Retorna la siguiente victima
     def nextVictim(self):
-        log.logger.info("Table Page: " + str(self.pageTable()))
+        log.logger.info("Table Page: %s", self.pageTable())
         return self.listVictim().returnVictim()
 
     def setFrameInPage(self, pid , page, frame):
@@ -6,20 +6,31 @@ import log
 class TablePage():
 
     def __init__(self):
-        self._queuePage = []
+        ## pid -> {page -> Row}, las paginas de cada pid quedan en orden
+        self._rowsOfPid = dict()
 
     def queuePage(self):
-        return self._queuePage
+        res = []
+        for rows in self._rowsOfPid.values():
+            res.extend(rows.values())
+        return res
 
     def addRow(self, pid, page):
-        self._queuePage.append(Row( pid, page))
+        self.pageTableOfPID(pid)[page] = Row(pid, page)
+
+    ###Tabla de paginas del proceso: {page -> Row}
+    def pageTableOfPID(self, pid):
+        rows = self._rowsOfPid.get(pid)
+        if rows == None:
+            rows = dict()
+            self._rowsOfPid[pid] = rows
+        return rows
 
     def returnRowsOfPID(self, pid):
-        res = []
-        for row in self.queuePage():
-            if row.pid() == pid:
-                res.append(row)
-        return res
+        rows = self._rowsOfPid.get(pid)
+        if rows == None:
+            return []
+        return list(rows.values())
 
     def setFrameOfPage(self, pid, page, frame):
         row = self.pageOfPid(pid, page)
@@ -31,10 +42,10 @@ class TablePage():
 
     ###Retorna la pagina deseada pertenciente a un pid
     def pageOfPid(self, pid, page):
-        rows = self.returnRowsOfPID(pid)
-        for row in rows:
-            if row.page() == page:
-                return row
+        rows = self._rowsOfPid.get(pid)
+        if rows == None:
+            return None
+        return rows.get(page)
 
     def __repr__(self):
-        return "(" + "TABLEPAGE ={table}".format(table=self._queuePage) + ")"
+        return "(" + "TABLEPAGE ={table}".format(table=self.queuePage()) + ")"